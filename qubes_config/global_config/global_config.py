@@ -52,6 +52,14 @@ from gi.repository import Gtk, GLib, GObject
 
 logger = logging.getLogger('qubes-config-manager')
 
+# resolved once, on import
+GLADE_PATH = pkg_resources.resource_filename(
+    'qubes_config', 'global_config.glade')
+LIGHT_THEME_PATH = pkg_resources.resource_filename(
+    'qubes_config', 'qubes-global-config-light.css')
+DARK_THEME_PATH = pkg_resources.resource_filename(
+    'qubes_config', 'qubes-global-config-dark.css')
+
 
 class ClipboardHandler(PageHandler):
     """Handler for Clipboard policy. Adds a couple of comboboxes to a
@@ -255,6 +263,7 @@ class GlobalConfig(Gtk.Application):
         self.progress_bar_dialog = ProgressBarDialog(
             self, "Loading system settings...")
         self.handlers: Dict[str, PageHandler] = {}
+        self.main_window: Optional[Gtk.Window] = None
 
     def do_activate(self, *args, **kwargs):
         """
@@ -262,6 +271,9 @@ class GlobalConfig(Gtk.Application):
         only at true first start, in other cases just presenting the main window
         to user.
         """
+        if self.main_window:
+            self.main_window.present()
+            return
         self.register_signals()
         self.perform_setup()
         assert self.main_window
@@ -295,18 +307,15 @@ class GlobalConfig(Gtk.Application):
         self.progress_bar_dialog.update_progress(0)
 
         self.builder = Gtk.Builder()
-        self.builder.add_from_file(pkg_resources.resource_filename(
-            'qubes_config', 'global_config.glade'))
+        self.builder.add_from_file(GLADE_PATH)
 
         self.main_window = self.builder.get_object('main_window')
         self.main_notebook: Gtk.Notebook = \
             self.builder.get_object('main_notebook')
 
         load_theme(widget=self.main_window,
-                   light_theme_path=pkg_resources.resource_filename(
-                       'qubes_config', 'qubes-global-config-light.css'),
-                   dark_theme_path=pkg_resources.resource_filename(
-                       'qubes_config', 'qubes-global-config-dark.css'))
+                   light_theme_path=LIGHT_THEME_PATH,
+                   dark_theme_path=DARK_THEME_PATH)
 
         self.apply_button: Gtk.Button = self.builder.get_object('apply_button')
         self.cancel_button: Gtk.Button = \
@@ -593,12 +593,16 @@ class VMSubsetPolicyHandler(PolicyHandler):
         if self.disable_radio.get_active():
             return self.policy_manager.text_to_rules(self.default_policy)
         rules: List[Rule] = []
+        # rules are compared by their text form, kept here to avoid
+        # re-formatting all collected rules for every new one
+        seen_rules: Set[str] = set()
         for row in self.exception_list_box.get_children():
             new_rule: Rule = row.rule.raw_rule
-            if str(new_rule) in [str(rule) for rule in rules]:
+            if str(new_rule) in seen_rules:
                 # do not save duplicates
                 continue
             rules.append(new_rule)
+            seen_rules.add(str(new_rule))
 
             if new_rule.target == '@default':
                 if getattr(new_rule.action, "default_target", None):
@@ -611,10 +615,11 @@ class VMSubsetPolicyHandler(PolicyHandler):
                     service=self.service_name, source=new_rule.source,
                     target=new_target,
                     action=type(new_rule.action).__name__.lower())
-                if str(another_rule) in [str(rule) for rule in rules]:
+                if str(another_rule) in seen_rules:
                     # do not save duplicates
                     continue
                 rules.append(another_rule)
+                seen_rules.add(str(another_rule))
         rules.extend([row.rule.raw_rule for row in
                       self.main_list_box.get_children()])
         return rules
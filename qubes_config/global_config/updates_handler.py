@@ -46,9 +46,57 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
 
+class QubesRepoClient:
+    """Client for the dom0 qubes.repos.* services, used to list, enable
+    and disable update repositories. Raises RuntimeError if the service
+    call fails."""
+    def list_repos(self) -> Dict[str, Dict]:
+        """Get a dict of repository name: dict with its 'prettyname' and
+        'enabled' state."""
+        repos: Dict[str, Dict] = {}
+        for row in self._run_qrexec_repo('qubes.repos.List').split('\n'):
+            lst = row.split('\0')
+            repo_name = lst[0]
+            repos[repo_name] = dict()
+            repos[repo_name]['prettyname'] = lst[1]
+            repos[repo_name]['enabled'] = (lst[2] == 'enabled')
+        return repos
+
+    def set_repository(self, repository: str, state: bool):
+        """Enable or disable the provided repository."""
+        action = 'Enable' if state else 'Disable'
+        result = self._run_qrexec_repo(f'qubes.repos.{action}', repository)
+        if result != 'ok\n':
+            raise RuntimeError('qrexec call stdout did not contain "ok"'
+                        ' as expected')
+
+    @staticmethod
+    def _run_qrexec_repo(service, arg=''):
+        # Set default locale to C in order to prevent error msg
+        # in subprocess call related to falling back to C locale
+        env = os.environ.copy()
+        env['LC_ALL'] = 'C'
+        # Fake up a "qrexec call" to dom0 because dom0 can't qrexec to itself
+        cmd = '/etc/qubes-rpc/' + service
+        process = subprocess.run(['sudo', cmd, arg],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           check=False, env=env)
+        if process.returncode != 0 or process.stderr:
+            raise RuntimeError('qrexec call failed')
+        return process.stdout.decode('utf-8')
+
+
 class RepoHandler:
     """Handler for repository settings."""
-    def __init__(self, gtk_builder: Gtk.Builder):
+    def __init__(self, gtk_builder: Gtk.Builder,
+                 repo_client: Optional[QubesRepoClient] = None):
+        """
+        :param gtk_builder: Gtk.Builder
+        :param repo_client: client used to access repository settings;
+        if not provided, QubesRepoClient will be used
+        """
+        self.repo_client = repo_client or QubesRepoClient()
+
         self.dom0_stable_radio: Gtk.RadioButton = \
             gtk_builder.get_object('updates_dom0_stable_radio')
         self.dom0_testing_sec_radio: Gtk.RadioButton = \
@@ -99,12 +147,7 @@ class RepoHandler:
 
     def _load_data(self):
         try:
-            for row in self._run_qrexec_repo('qubes.repos.List').split('\n'):
-                lst = row.split('\0')
-                repo_name = lst[0]
-                self.repos[repo_name] = dict()
-                self.repos[repo_name]['prettyname'] = lst[1]
-                self.repos[repo_name]['enabled'] = (lst[2] == 'enabled')
+            self.repos = self.repo_client.list_repos()
         except RuntimeError:
             # disable all repo-related stuff
             self.dom0_stable_radio.set_sensitive(False)
@@ -128,28 +171,6 @@ class RepoHandler:
             for repo, widget in repo_dict.items():
                 self.initial_state[repo] = widget.get_active()
 
-    @staticmethod
-    def _run_qrexec_repo(service, arg=''):
-        # Set default locale to C in order to prevent error msg
-        # in subprocess call related to falling back to C locale
-        env = os.environ.copy()
-        env['LC_ALL'] = 'C'
-        # Fake up a "qrexec call" to dom0 because dom0 can't qrexec to itself
-        cmd = '/etc/qubes-rpc/' + service
-        process = subprocess.run(['sudo', cmd, arg],
-                           stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                           check=False, env=env)
-        if process.returncode != 0 or process.stderr:
-            raise RuntimeError('qrexec call failed')
-        return process.stdout.decode('utf-8')
-
-    def _set_repository(self, repository, state):
-        action = 'Enable' if state else 'Disable'
-        result = self._run_qrexec_repo(f'qubes.repos.{action}', repository)
-        if result != 'ok\n':
-            raise RuntimeError('qrexec call stdout did not contain "ok"'
-                        ' as expected')
-
     def get_unsaved(self) -> str:
         """Get human-readable description of unsaved changes, or
         empty string if none were found."""
@@ -189,9 +210,10 @@ class RepoHandler:
                 try:
                     if widget.get_active() or found:
                         found = True
-                        self._set_repository(repo, widget.get_active())
+                        self.repo_client.set_repository(
+                            repo, widget.get_active())
                     else:
-                        self._set_repository(repo, False)
+                        self.repo_client.set_repository(repo, False)
                 except RuntimeError as ex:
                     raise qubesadmin.exc.QubesException(
                         f'Failed to set repository data: {ex}') from ex
@@ -371,6 +393,9 @@ class UpdateProxy:
         self.problem_box: Gtk.Box = \
             gtk_builder.get_object('updates_problem_policy')
 
+        # row added by the most recent add_new_rule call
+        self._new_row: Optional[NoActionListBoxRow] = None
+
         self.rules, self.current_token = \
             self.policy_manager.get_rules_from_filename(
                 self.policy_file_name, "")
@@ -463,9 +488,17 @@ class UpdateProxy:
             service=self.service_name, source=str(self.first_eligible_vm),
             target='@default',
             action=f'allow target={self.default_updatevm}')
-        new_row = self._get_row(new_rule, new=True)
-        self.updatevm_exception_list.add(new_row)
-        new_row.activate()
+        self._new_row = self._get_row(new_rule, new=True)
+        self.updatevm_exception_list.add(self._new_row)
+        self._new_row.activate()
+
+    def get_editing_row(self) -> Optional[NoActionListBoxRow]:
+        """Get the row added with add_new_rule, if it is still in the
+        exception list and in edit mode; otherwise, return None."""
+        if self._new_row and self._new_row.editing and \
+                self._new_row.get_parent() is self.updatevm_exception_list:
+            return self._new_row
+        return None
 
     def _rule_clicked(self, _list_box, row: NoActionListBoxRow, *_args):
         if row.editing:
@@ -20,7 +20,7 @@
 """
 Widget that's a flow box with vms.
 """
-from typing import Optional, List, Callable
+from typing import Optional, List, Callable, Dict
 
 from ..widgets.gtk_widgets import VMListModeler, QubeName
 from ..widgets.gtk_utils import load_icon, show_error, ask_question
@@ -140,9 +140,12 @@ class VMFlowboxHandler:
         self.placeholder = PlaceholderText()
         self.flowbox.add(self.placeholder)
 
+        # vm name: button, for quick access to buttons of selected vms
+        self._vm_buttons: Dict[str, VMFlowBoxButton] = {}
+
         self._initial_vms = sorted(initial_vms)
         for vm in self._initial_vms:
-            self.flowbox.add(VMFlowBoxButton(vm))
+            self._add_vm_button(vm)
         self.flowbox.show_all()
         self.placeholder.set_visible(not bool(self._initial_vms))
         self.add_box.set_visible(False)
@@ -179,13 +182,21 @@ class VMFlowboxHandler:
             show_error(self.flowbox, "Cannot add qube",
                        "This qube is already selected.")
             return
-        self.flowbox.add(VMFlowBoxButton(select_vm))
+        self._add_vm_button(select_vm)
         self.placeholder.set_visible(False)
         self.add_box.set_visible(False)
 
     def _vm_removed(self, *_args):
+        self._vm_buttons = {name: button
+                            for name, button in self._vm_buttons.items()
+                            if button.get_parent() is self.flowbox}
         self.placeholder.set_visible(not bool(self.selected_vms))
 
+    def _add_vm_button(self, vm: qubesadmin.vm.QubesVM):
+        button = VMFlowBoxButton(vm)
+        self.flowbox.add(button)
+        self._vm_buttons[str(vm)] = button
+
     def set_visible(self, state: bool):
         """Set flowbox to visible/usable."""
         self.box.set_visible(state)
@@ -196,19 +207,20 @@ class VMFlowboxHandler:
         """
         Add a vm to selected vms.
         """
-        self.flowbox.add(VMFlowBoxButton(vm))
+        self._add_vm_button(vm)
+
+    def find_button_for_vm(self, vm_name: str) -> Optional[VMFlowBoxButton]:
+        """Get the button representing the selected vm with the provided
+        name, or None if that vm is not selected."""
+        return self._vm_buttons.get(vm_name)
 
     @property
     def selected_vms(self) -> List[qubesadmin.vm.QubesVM]:
         """Get current list of selected vms"""
-        selected_vms: List[qubesadmin.vm.QubesVM] = []
         if not self.box.get_visible():
-            return selected_vms
-        for child in self.flowbox.get_children():
-            if isinstance(child, PlaceholderText):
-                continue
-            selected_vms.append(child.vm)
-        return selected_vms
+            return []
+        # same order as in the flowbox, which is sorted by vm name
+        return [self._vm_buttons[name].vm for name in sorted(self._vm_buttons)]
 
     def is_changed(self) -> bool:
         """Is the flowbox changed from initial state?"""
@@ -220,10 +232,10 @@ class VMFlowboxHandler:
 
     def reset(self):
         """Reset changed to initial state."""
-        for child in self.flowbox.get_children():
-            if isinstance(child, VMFlowBoxButton):
-                self.flowbox.remove(child)
+        for button in self._vm_buttons.values():
+            self.flowbox.remove(button)
+        self._vm_buttons.clear()
 
         for vm in self._initial_vms:
-            self.flowbox.add(VMFlowBoxButton(vm))
+            self._add_vm_button(vm)
         self.placeholder.set_visible(not bool(self.selected_vms))
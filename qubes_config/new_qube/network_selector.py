@@ -141,6 +141,6 @@ class NetworkSelector:
             tree_iter = self.network_custom_combo.get_active_iter()
             if tree_iter is not None:
                 model = self.network_custom_combo.get_model()
-                netvm = self.qapp.domains[model[tree_iter][1]]
+                netvm = self.qapp.domains[model[tree_iter][0]]
                 return netvm
         return qubesadmin.DEFAULT
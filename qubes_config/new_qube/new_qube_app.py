@@ -48,6 +48,13 @@ from gi.repository import Gtk, GObject
 logger = logging.getLogger('qubes-config-manager')
 WHONIX_QUBE_NAME = 'sys-whonix'
 
+# resolved once, on import
+GLADE_PATH = pkg_resources.resource_filename('qubes_config', 'new_qube.glade')
+LIGHT_THEME_PATH = pkg_resources.resource_filename(
+    'qubes_config', 'qubes-new-qube-light.css')
+DARK_THEME_PATH = pkg_resources.resource_filename(
+    'qubes_config', 'qubes-new-qube-dark.css')
+
 
 class CreateNewQube(Gtk.Application):
     """
@@ -73,6 +80,9 @@ class CreateNewQube(Gtk.Application):
         only at true first start, in other cases just presenting the main window
         to user.
         """
+        if self.main_window:
+            self.main_window.present()
+            return
         self.register_signals()
         self.perform_setup()
         assert self.main_window
@@ -89,8 +99,7 @@ class CreateNewQube(Gtk.Application):
         self.progress_bar_dialog.update_progress(0.1)
 
         self.builder = Gtk.Builder()
-        self.builder.add_from_file(pkg_resources.resource_filename(
-            'qubes_config', 'new_qube.glade'))
+        self.builder.add_from_file(GLADE_PATH)
 
         self.main_window = self.builder.get_object('main_window')
         self.qube_name: Gtk.Entry = self.builder.get_object('qube_name')
@@ -98,10 +107,8 @@ class CreateNewQube(Gtk.Application):
             self.builder.get_object('qube_label')
 
         load_theme(widget=self.main_window,
-                   light_theme_path=pkg_resources.resource_filename(
-                       'qubes_config', 'qubes-new-qube-light.css'),
-                   dark_theme_path=pkg_resources.resource_filename(
-                       'qubes_config', 'qubes-new-qube-dark.css'))
+                   light_theme_path=LIGHT_THEME_PATH,
+                   dark_theme_path=DARK_THEME_PATH)
 
         self.progress_bar_dialog.update_progress(0.1)
 
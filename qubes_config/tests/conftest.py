@@ -26,8 +26,15 @@ from typing import Mapping, Union, Tuple, List
 from qubesadmin.tests import QubesTest
 
 import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
+
+# conftest is imported before any test module, so versions required here
+# apply to the whole test session; test modules can import from
+# gi.repository directly
+_LOADED_NAMESPACES = gi.Repository.get_default().get_loaded_namespaces()
+for _namespace, _version in (('Gtk', '3.0'), ('GdkPixbuf', '2.0')):
+    if _namespace not in _LOADED_NAMESPACES:
+        gi.require_version(_namespace, _version)
+
 from gi.repository import Gtk
 
 from ..global_config.global_config import GlobalConfig
@@ -193,7 +200,7 @@ def add_feature_with_template_to_all(qapp, feature_name,
         else:
             result = b'2\x00QubesFeatureNotFoundError\x00\x00' + \
                      str(feature_name).encode() + b'\x00'
-        qapp.expected_calls[(vm, 'admin.vm.feature.CheckWithTemplate',
+        qapp.expected_calls[(vm.name, 'admin.vm.feature.CheckWithTemplate',
                              feature_name, None)] = result
 
 def add_feature_to_all(qapp, feature_name, enable_vm_names: List[str]):
@@ -205,15 +212,21 @@ def add_feature_to_all(qapp, feature_name, enable_vm_names: List[str]):
         else:
             result = b'2\x00QubesFeatureNotFoundError\x00\x00' + \
                      str(feature_name).encode() + b'\x00'
-        qapp.expected_calls[(vm, 'admin.vm.feature.Get',
+        qapp.expected_calls[(vm.name, 'admin.vm.feature.Get',
                              feature_name, None)] = result
 
 
-@pytest.fixture
-def test_qapp():
-    """Test QubesApp"""
+def _new_test_qapp() -> QubesTest:
     qapp = QubesTest()
     qapp._local_name = 'dom0'  # pylint: disable=protected-access
+    return qapp
+
+
+@pytest.fixture(scope='session')
+def test_qapp_calls():
+    """Expected calls of the test QubesApp; they are expensive to generate,
+    so they are only generated once and copied into each test_qapp."""
+    qapp = _new_test_qapp()
 
     add_dom0_vm_property(qapp, 'clockvm', 'sys-net')
     add_dom0_vm_property(qapp, 'updatevm', 'sys-net')
@@ -295,76 +308,134 @@ def test_qapp():
     add_feature_to_all(qapp, 'service.qubes-u2f-proxy',
                                      ['test-vm'])
 
+    return qapp.expected_calls
+
+
+@pytest.fixture
+def test_qapp(test_qapp_calls):  # pylint: disable=redefined-outer-name
+    """Test QubesApp"""
+    qapp = _new_test_qapp()
+    qapp.expected_calls.update(test_qapp_calls)
     return qapp
 
 
+# test_qapp is function-scoped, as tests modify its expected calls, so vm
+# fixtures taken from it are function-scoped too
 @pytest.fixture
-def test_qapp_whonix(test_qapp):  # pylint: disable=redefined-outer-name
-    # pylint does not understand fixtures
-    """Testing qapp with whonix vms added"""
-    add_expected_vm(test_qapp, 'sys-whonix', 'AppVM',
+def test_vm(test_qapp):  # pylint: disable=redefined-outer-name
+    """test-vm from test_qapp"""
+    return test_qapp.domains['test-vm']
+
+
+@pytest.fixture
+def blue_vm(test_qapp):  # pylint: disable=redefined-outer-name
+    """test-blue from test_qapp"""
+    return test_qapp.domains['test-blue']
+
+
+@pytest.fixture
+def red_vm(test_qapp):  # pylint: disable=redefined-outer-name
+    """test-red from test_qapp"""
+    return test_qapp.domains['test-red']
+
+
+@pytest.fixture(scope='session')
+def test_qapp_whonix_calls(test_qapp_calls):
+    # pylint: disable=redefined-outer-name
+    """Expected calls of the test QubesApp with whonix vms added; generated
+    once, like test_qapp_calls."""
+    qapp = _new_test_qapp()
+    qapp.expected_calls.update(test_qapp_calls)
+    add_expected_vm(qapp, 'sys-whonix', 'AppVM',
                     {},
                     {'service.qubes-update-check': None,
                      'service.qubes-updates-proxy': 1}, ['anon-gateway'])
-    add_expected_vm(test_qapp, 'anon-whonix', 'AppVM',
+    add_expected_vm(qapp, 'anon-whonix', 'AppVM',
                     {},
                     {'service.qubes-update-check': None}, ['anon-gateway'])
-    add_expected_vm(test_qapp, 'whonix-gw-15', 'TemplateVM',
+    add_expected_vm(qapp, 'whonix-gw-15', 'TemplateVM',
                     {"netvm": ("vm", False, '')},
                     {'service.qubes-update-check': None}, ['whonix-updatevm'])
-    add_expected_vm(test_qapp, 'whonix-gw-14', 'TemplateVM',
+    add_expected_vm(qapp, 'whonix-gw-14', 'TemplateVM',
                     {"netvm": ("vm", False, '')},
                     {'service.qubes-update-check': None}, ['whonix-updatevm'])
+    return qapp.expected_calls
+
+
+@pytest.fixture
+def test_qapp_whonix(test_qapp, test_qapp_whonix_calls):
+    # pylint: disable=redefined-outer-name
+    # pylint does not understand fixtures
+    """Testing qapp with whonix vms added"""
+    test_qapp.expected_calls.update(test_qapp_whonix_calls)
     test_qapp.domains.clear_cache()
     return test_qapp
 
-SIGNALS_REGISTERED = False
+
+@pytest.fixture(scope='session')
+def global_config_signals():
+    """Register all the signals various global config widgets might emit."""
+    GlobalConfig.register_signals()
+
+
+@pytest.fixture(scope='session')
+def new_qube_signals():
+    """Register all the signals various new qube widgets might emit."""
+    CreateNewQube.register_signals()
+
+
+def _read_glade(package: str, file_name: str) -> str:
+    with open(pkg_resources.resource_filename(package, file_name),
+              encoding='utf-8') as glade_file:
+        return glade_file.read()
+
+
+@pytest.fixture(scope='session')
+def test_glade():
+    """Contents of the test glade file, read once per session"""
+    return _read_glade(__name__, 'test.glade')
+
+
+@pytest.fixture(scope='session')
+def global_config_glade():
+    """Contents of the global config glade file, read once per session"""
+    return _read_glade('qubes_config', 'global_config.glade')
+
+
+@pytest.fixture(scope='session')
+def new_qube_glade():
+    """Contents of the new qube glade file, read once per session"""
+    return _read_glade('qubes_config', 'new_qube.glade')
+
+
+# builders themselves are function-scoped: handlers connect their own
+# callbacks to the widgets, so widgets cannot be shared between tests
 
 @pytest.fixture
-def test_builder():
+def test_builder(global_config_signals, test_glade):
+    # pylint: disable=redefined-outer-name, unused-argument
     """Test gtk_builder with loaded test glade file and registered signals."""
-    global SIGNALS_REGISTERED  # pylint:disable=global-statement
-    # register all the signals various widgets might emit
-    if not SIGNALS_REGISTERED:
-        GlobalConfig.register_signals()
-        SIGNALS_REGISTERED = True
     # test glade file contains very simple setup with correctly named widgets
     builder = Gtk.Builder()
-    builder.add_from_file(pkg_resources.resource_filename(
-        __name__, 'test.glade'))
+    builder.add_from_string(test_glade)
     return builder
 
+
 @pytest.fixture
-def real_builder():
+def real_builder(global_config_signals, global_config_glade):
+    # pylint: disable=redefined-outer-name, unused-argument
     """Gtk builder with actual config glade file registered"""
-    global SIGNALS_REGISTERED  # pylint:disable=global-statement
-    # register all the signals various widgets might emit
-    if not SIGNALS_REGISTERED:
-        GlobalConfig.register_signals()
-        SIGNALS_REGISTERED = True
-    # test glade file contains very simple setup with correctly named widgets
     builder = Gtk.Builder()
-    builder.add_from_file(pkg_resources.resource_filename(
-        'qubes_config', 'global_config.glade'))
+    builder.add_from_string(global_config_glade)
     return builder
 
 
-
-NEW_QUBE_SIGNALS_REGISTERED = False
-
-
 @pytest.fixture
-def new_qube_builder():
-    """Gtk builder with actual config glade file registered"""
-    global NEW_QUBE_SIGNALS_REGISTERED  # pylint:disable=global-statement
-    # register all the signals various widgets might emit
-    if not NEW_QUBE_SIGNALS_REGISTERED:
-        CreateNewQube.register_signals()
-        NEW_QUBE_SIGNALS_REGISTERED = True
-    # test glade file contains very simple setup with correctly named widgets
+def new_qube_builder(new_qube_signals, new_qube_glade):
+    # pylint: disable=redefined-outer-name, unused-argument
+    """Gtk builder with actual new qube glade file registered"""
     builder = Gtk.Builder()
-    builder.add_from_file(pkg_resources.resource_filename(
-        'qubes_config', 'new_qube.glade'))
+    builder.add_from_string(new_qube_glade)
     return builder
 
 
@@ -407,7 +478,8 @@ Test * test-red test-blue deny"""
 @pytest.fixture
 def test_policy_manager():
     """Policy manager with patched out object requiring actual working
-    Admin API methods"""
+    Admin API methods. Each test gets its own policy client, so tests can
+    freely replace policy files without affecting each other."""
     manager = PolicyManager()
     manager.policy_client = TestPolicyClient()
     return manager
@@ -28,9 +28,6 @@ from ..global_config.basics_handler import KernelVersion, PropertyHandler, \
     FeatureHandler, QMemManHelper, MemoryHandler, BasicSettingsHandler, \
     KernelHolder
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 
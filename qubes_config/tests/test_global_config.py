@@ -29,9 +29,6 @@ from ..global_config.global_config import GlobalConfig, ClipboardHandler,\
 from ..global_config.usb_devices import DevicesHandler
 from ..global_config.basics_handler import BasicSettingsHandler
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 # this entire file has a peculiar arrangement with mock signal registration:
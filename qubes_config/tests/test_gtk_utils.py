@@ -20,13 +20,11 @@
 """Tests for gtk utils"""
 from unittest.mock import patch, call
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import GdkPixbuf, Gtk, Gdk
 
+from ..widgets import gtk_utils
 from ..widgets.gtk_utils import load_icon, load_icon_at_gtk_size, \
-    ask_question, show_error, is_theme_light
+    ask_question, show_error, is_theme_light, load_theme
 
 def test_load_icon():
     """Test loading icon methods; tests if they don't error out and
@@ -47,6 +45,12 @@ def test_load_icon():
     assert isinstance(icon_from_name, GdkPixbuf.Pixbuf)
     assert isinstance(icon_from_error, GdkPixbuf.Pixbuf)
 
+    # loaded icons are reused
+    assert load_icon('xterm') is icon_from_name
+    assert load_icon('xterm', 20, 20) is not icon_from_name
+    # missing icons of the same size share one blank pixbuf
+    assert load_icon('asdfghjkl') is icon_from_error
+
 def test_ask_question():
     """Simple test to see if the function does something
     and if the function correctly executes run and destroy (instead of,
@@ -99,3 +103,32 @@ label {
     label = Gtk.Label()
 
     assert is_theme_light(label)
+
+
+def test_load_theme(tmp_path):
+    """test that theme files are parsed once and only one theme is applied"""
+    # pylint: disable=protected-access
+    light_path = tmp_path / 'light.css'
+    dark_path = tmp_path / 'dark.css'
+    light_path.write_text('.test_light_theme {}')
+    dark_path.write_text('.test_dark_theme {}')
+    window = Gtk.Window()
+
+    with patch('qubes_config.widgets.gtk_utils.is_theme_light',
+               return_value=True):
+        load_theme(window, str(light_path), str(dark_path))
+    light_provider = gtk_utils._CSS_PROVIDERS[str(light_path)]
+    assert gtk_utils._applied_provider is light_provider
+
+    with patch('qubes_config.widgets.gtk_utils.is_theme_light',
+               return_value=False):
+        load_theme(window, str(light_path), str(dark_path))
+    assert gtk_utils._applied_provider is \
+           gtk_utils._CSS_PROVIDERS[str(dark_path)]
+
+    with patch('qubes_config.widgets.gtk_utils.is_theme_light',
+               return_value=True):
+        load_theme(window, str(light_path), str(dark_path))
+    # provider is reused, not created from the file again
+    assert gtk_utils._CSS_PROVIDERS[str(light_path)] is light_provider
+    assert gtk_utils._applied_provider is light_provider
@@ -19,9 +19,6 @@
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 """Tests for widget library"""
 # pylint: disable=missing-function-docstring
-import gi
-
-gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
 from ..widgets import gtk_widgets
@@ -49,6 +46,10 @@ def test_token_name(test_qapp):
     assert not child.get_style_context().has_class('qube-box-blue')
     assert child.get_style_context().has_class('qube-box-red')
 
+    # setting the same token again keeps the existing widget
+    token_name.set_token('test-red')
+    assert token_name.get_children() == [child]
+
 
 def test_token_name_categories(test_qapp):
     token_name = gtk_widgets.TokenName("@anyvm", test_qapp, {'@anyvm': 'Any'})
@@ -260,11 +261,10 @@ def test_text_modeler_style_changes_none_val():
 ### VMModeler tests ###
 #######################
 
-def get_selected_text(combobox: Gtk.ComboBox, col_no: int = 1):
+def get_selected_text(combobox: Gtk.ComboBox, col_no: int = 0):
     tree_iter = combobox.get_active_iter()
     model = combobox.get_model()
-    # in VMListModeler 0 is row numer, 1 is readable name,
-    # 2 is pixbuf, 3 is api_name
+    # in VMListModeler 0 is readable name, 1 is pixbuf, 2 is api_name
     return model[tree_iter][col_no]
 
 #### initial params
@@ -339,7 +339,7 @@ def test_vmmodeler_default_current(test_qapp):
     found = False
     model = combobox.get_model()
     for item in model:
-        if item[1] == 'test-blue (default)':
+        if item[0] == 'test-blue (default)':
             found = True
     assert found
 
@@ -356,7 +356,7 @@ def test_vmmodeler_filter(test_qapp):
     selected_vms = []
     model = combobox.get_model()
     for item in model:
-        selected_vms.append(item[1])
+        selected_vms.append(item[0])
 
     assert sorted(selected_vms) == sorted(vms)
 
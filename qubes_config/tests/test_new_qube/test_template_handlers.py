@@ -26,9 +26,6 @@ from unittest.mock import patch, Mock, ANY
 from ...new_qube.template_handler import TemplateHandler
 from ...new_qube.application_selector import ApplicationData
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 
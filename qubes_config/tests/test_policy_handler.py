@@ -25,9 +25,6 @@ from ..global_config.policy_handler import PolicyHandler, VMSubsetPolicyHandler
 from ..global_config.policy_rules import SimpleVerbDescription, RuleSimple, \
     RuleTargeted
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 
@@ -21,15 +21,13 @@
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-class-docstring
 from unittest.mock import Mock, patch
+import pytest
 from qrexec.policy.parser import Rule
 from ..global_config.policy_handler import PolicyHandler
 from ..global_config.policy_rules import RuleSimple, SimpleVerbDescription
 from ..global_config.rule_list_widgets import VMWidget, ActionWidget,\
     RuleListBoxRow, NoActionListBoxRow, LimitedRuleListBoxRow
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 
@@ -100,43 +98,43 @@ def test_action_widget():
     assert not action_widget.name_widget.get_visible()
     assert action_widget.combobox.get_visible()
 
+def _assert_selected(action_widget, token, label):
+    assert str(action_widget.get_selected()) == token
+    assert action_widget.name_widget.get_text() == label
+    assert action_widget.combobox.get_active_id() == label
+
+
 def test_action_widget_choices():
     # RuleSimple names:
+    allow = RuleSimple.ACTION_CHOICES['allow']
+    ask = RuleSimple.ACTION_CHOICES['ask']
+
     rule = make_rule('vm1', 'vm2', 'allow')
     action_widget = ActionWidget(rule.ACTION_CHOICES, None, rule)
 
     assert not action_widget.is_changed()
     assert str(action_widget.get_selected()) == 'allow'
-    assert action_widget.name_widget.get_text() == \
-           RuleSimple.ACTION_CHOICES['allow']
+    assert action_widget.name_widget.get_text() == allow
 
     action_widget.set_editable(True)
-    action_widget.combobox.set_active_id(RuleSimple.ACTION_CHOICES['ask'])
+    action_widget.combobox.set_active_id(ask)
     assert action_widget.is_changed()
 
     # get back to ineditable, change should be discarded
     action_widget.set_editable(False)
-    assert str(action_widget.get_selected()) == 'allow'
-    assert action_widget.name_widget.get_text() == \
-           RuleSimple.ACTION_CHOICES['allow']
-    assert action_widget.combobox.get_active_id() == \
-           RuleSimple.ACTION_CHOICES['allow']
+    _assert_selected(action_widget, 'allow', allow)
     assert not action_widget.is_changed()
 
     # let's change stuff for real
     action_widget.set_editable(True)
-    action_widget.combobox.set_active_id(RuleSimple.ACTION_CHOICES['ask'])
+    action_widget.combobox.set_active_id(ask)
     assert action_widget.is_changed()
 
     action_widget.save()
     action_widget.set_editable(False)
 
     assert not action_widget.is_changed()
-    assert str(action_widget.get_selected()) == 'ask'
-    assert action_widget.name_widget.get_text() == \
-           RuleSimple.ACTION_CHOICES['ask']
-    assert action_widget.combobox.get_active_id() == \
-           RuleSimple.ACTION_CHOICES['ask']
+    _assert_selected(action_widget, 'ask', ask)
 
 def test_action_widget_verbdescr():
     # RuleSimple names:
@@ -199,66 +197,68 @@ def test_rule_row(test_qapp):
                str(make_rule('test-vm', 'test-red', 'ask').raw_rule)
 
 
-def test_rule_delete_new(test_qapp):
-    mock_handler = Mock(spec=PolicyHandler)
-    mock_handler.verify_new_rule.return_value = None
+@pytest.fixture
+def mock_handler():
+    handler = Mock(spec=PolicyHandler)
+    handler.verify_new_rule.return_value = None
+    return handler
+
+
+@pytest.fixture
+def ask_rule():
+    return make_rule('test-blue', 'test-red', 'ask')
 
-    rule = make_rule('test-blue', 'test-red', 'ask')
 
+@pytest.fixture
+def new_row(mock_handler, ask_rule, test_qapp):
+    # pylint: disable=redefined-outer-name
     rule_row = RuleListBoxRow(
         parent_handler=mock_handler,
-        rule=rule,
+        rule=ask_rule,
         qapp=test_qapp,
         is_new_row=True
     )
-
     rule_row.set_edit_mode(True)
+    return rule_row
 
-    with patch('qubes_config.global_config.rule_list_widgets.'
-               'RuleListBoxRow._do_delete_self') as mock_delete:
-        # check that rule will try to delete itself if exiting edit mode
-        # with no changes
-        rule_row.set_edit_mode(False)
-        assert mock_delete.mock_calls
 
-    rule_row = RuleListBoxRow(
-        parent_handler=mock_handler,
-        rule=rule,
-        qapp=test_qapp,
-        is_new_row=True
-    )
+@pytest.fixture
+def mock_delete():
+    with patch.object(RuleListBoxRow, '_do_delete_self') as mock:
+        yield mock
 
-    rule_row.set_edit_mode(True)
-    rule_row.source_widget.model.select_value('test-vm')
-    with patch('qubes_config.global_config.rule_list_widgets.'
-               'RuleListBoxRow._do_delete_self') as mock_delete, \
-        patch.object(rule_row, 'get_parent'):
-        # check that rule will NOT try to delete itself if saving with changes
-        assert rule_row.validate_and_save()
-        assert not mock_delete.mock_calls
 
-    # and now for a harder problem: let's try an invalid rule; it should
-    # not save itself and try to delete itself
-    rule = make_rule('test-blue', 'test-red', 'ask')
+def test_new_row_deletes_on_exit_without_changes(new_row, mock_delete):
+    # pylint: disable=redefined-outer-name
+    # check that rule will try to delete itself if exiting edit mode
+    # with no changes
+    new_row.set_edit_mode(False)
+    assert mock_delete.called
 
-    rule_row = RuleListBoxRow(
-        parent_handler=mock_handler,
-        rule=rule,
-        qapp=test_qapp,
-        is_new_row=True
-    )
 
-    rule_row.set_edit_mode(True)
-    rule_row.source_widget.model.select_value('test-vm')
-    assert rule_row.is_changed()
+def test_new_row_saves_on_exit_with_changes(new_row, mock_delete):
+    # pylint: disable=redefined-outer-name
+    new_row.source_widget.model.select_value('test-vm')
+    with patch.object(new_row, 'get_parent'):
+        # check that rule will NOT try to delete itself if saving with changes
+        assert new_row.validate_and_save()
+        assert not mock_delete.called
+
+
+def test_new_row_rejects_invalid_on_save(new_row, ask_rule):
+    # pylint: disable=redefined-outer-name
+    # an invalid rule should not save itself and try to delete itself
+    new_row.source_widget.model.select_value('test-vm')
+    assert new_row.is_changed()
 
     # the rule should not have exited the edit mode
-    with patch.object(rule, 'get_rule_errors', return_value='a'), \
+    with patch.object(ask_rule, 'get_rule_errors', return_value='a'), \
             patch('qubes_config.global_config.rule_list_widgets.'
               'show_error') as mock_error:
-        rule_row.validate_and_save()
+        new_row.validate_and_save()
         assert mock_error.mock_calls
 
+
 def test_no_action_row(test_qapp):
     mock_handler = Mock(spec=PolicyHandler)
     mock_handler.verify_new_rule.return_value = None
@@ -312,11 +312,10 @@ def test_rule_row_init_delete(test_qapp):
     )
 
     # try to find a non-sensitive delete button
-    for child in rule_row.target_widget.get_children():
-        if isinstance(child, Gtk.Button) and not child.get_sensitive():
-            break
-    else:
-        assert False  # failed to find a non-working delete button
+    children = rule_row.target_widget.get_children()
+    if next((child for child in children if isinstance(child, Gtk.Button)
+             and not child.get_sensitive()), None) is None:
+        pytest.fail("failed to find a non-working delete button")
 
 
     rule_row = RuleListBoxRow(
@@ -327,11 +326,10 @@ def test_rule_row_init_delete(test_qapp):
     )
 
     # try to find a sensitive delete button
-    for child in rule_row.target_widget.get_children():
-        if isinstance(child, Gtk.Button) and child.get_sensitive():
-            break
-    else:
-        assert False  # failed to find a non-working delete button
+    children = rule_row.target_widget.get_children()
+    if next((child for child in children if isinstance(child, Gtk.Button)
+             and child.get_sensitive()), None) is None:
+        pytest.fail("failed to find a working delete button")
 
 def test_rule_row_init_edit_vm(test_qapp):
     mock_handler = Mock(spec=PolicyHandler)
@@ -21,39 +21,115 @@
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-class-docstring
 # pylint: disable=protected-access
+# pylint: disable=redefined-outer-name
 
-from unittest.mock import patch, call
-from functools import partial
+import subprocess
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+from unittest.mock import patch
+from functools import lru_cache, partial
 
 import pytest
 
 import qubesadmin.exc
+from qrexec.policy.parser import Rule
 from ..global_config.updates_handler import RepoHandler, UpdateCheckerHandler, \
-    UpdateProxy, UpdatesHandler
-from ..global_config.rule_list_widgets import NoActionListBoxRow
+    UpdateProxy, UpdatesHandler, QubesRepoClient
+from ..global_config.policy_manager import PolicyManager
 
-import gi
-gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
 
-class MockProcess:
-    def __init__(self, stdout=b'', returncode=0, stderr=None):
-        self.stderr = stderr
-        self.returncode = returncode
-        self.stdout = stdout
+UPDATE_CHECK_NOT_FOUND = \
+    b'2\x00QubesFeatureNotFoundError\x00\x00service.qubes-update-check\x00'
+DEFAULT_UPDATE_CHECK_NOT_FOUND = \
+    b'2\x00QubesFeatureNotFoundError\x00\x00' \
+    b'config.default.qubes-update-check\x00'
 
+POLICY_TEMPLATEVM = """
+Proxy * @type:TemplateVM @default allow target=sys-firewall
+"""
 
-FULL_LIST = """qubes-dom0-current-testing\0c\0disabled
-qubes-dom0-security-testing\0c\0enabled
-qubes-dom0-current\0c\0enabled
-qubes-templates-itl-testing\0c\0enabled
-qubes-templates-itl\0c\0enabled
-qubes-templates-community-testing\0c\0enabled
-qubes-templates-community\0c\0enabled"""
+POLICY_WHONIX = """
+Proxy * @type:TemplateVM @default allow target=sys-firewall
+Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
+"""
+
+POLICY_EXCEPTION = """
+Proxy * fedora-36 @default allow target=sys-net
+Proxy * @type:TemplateVM @default allow target=sys-firewall
+Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
+"""
+
+# policies expected to be saved by the update proxy save tests
+POLICY_SAVED_UPDATEVM = """
+Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
+Proxy * @type:TemplateVM @default allow target=sys-firewall
+"""
+
+POLICY_SAVED_WHONIX = """
+Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
+Proxy * @type:TemplateVM @default allow target=sys-net
+"""
+
+POLICY_SAVED_EXCEPTION = """
+Proxy * fedora-36 @default allow target=sys-firewall
+Proxy * @tag:whonix-updatevm @default allow target=sys-whonix
+Proxy * @type:TemplateVM @default allow target=sys-net
+"""
 
 
-ALL_ENABLED = """qubes-dom0-current-testing\0c\0enabled
+@lru_cache(maxsize=None)
+def parse_rules(policy_text: str) -> Tuple[Rule, ...]:
+    """Parse policy text used as a test expectation; expected policies do
+    not change between tests, so each one is parsed only once."""
+    return tuple(PolicyManager.text_to_rules(policy_text))
+
+
+@pytest.fixture(scope='session')
+def all_vm_names(test_qapp_calls):
+    """Names of all qubes available in test_qapp, read once from the
+    expected admin.vm.List reply"""
+    vm_list = test_qapp_calls[('dom0', 'admin.vm.List', None, None)]
+    # skip the b'0\x00' success prefix; each line is 'name class=...'
+    return frozenset(line.split(' ', 1)[0]
+                     for line in vm_list[2:].decode().splitlines())
+
+
+@pytest.fixture
+def update_check_calls(test_qapp):
+    """Setter for expected_calls of test_qapp for boolean feature lookups,
+    by default of the 'check for updates' feature: takes a dict of
+    vm name: True/False"""
+    def _set(vm_states: Dict[str, bool],
+             feature: str = UpdateCheckerHandler.FEATURE_NAME):
+        for vm_name, state in vm_states.items():
+            test_qapp.expected_calls[
+                (vm_name, 'admin.vm.feature.Get', feature, None)] = \
+                b'0\x001' if state else b'0\x00'
+    return _set
+
+
+@pytest.fixture
+def make_update_checker(real_builder, test_qapp, update_check_calls):
+    """Factory of UpdateCheckerHandlers: sets provided initial states of
+    the 'check for updates' feature and then constructs the handler; if
+    default is provided, it is used as the dom0 default setting."""
+    def _make(vm_states: Optional[Dict[str, bool]] = None,
+              default: Optional[bool] = None) -> UpdateCheckerHandler:
+        if default is not None:
+            update_check_calls({'dom0': default},
+                               feature='config.default.qubes-update-check')
+        update_check_calls(vm_states or {})
+        return UpdateCheckerHandler(real_builder, test_qapp)
+    return _make
+
+
+MockProcess = namedtuple('MockProcess', ['stdout', 'returncode', 'stderr'],
+                         defaults=(b'', 0, None))
+
+
+FULL_LIST = b"""qubes-dom0-current-testing\0c\0disabled
 qubes-dom0-security-testing\0c\0enabled
 qubes-dom0-current\0c\0enabled
 qubes-templates-itl-testing\0c\0enabled
@@ -62,140 +138,213 @@ qubes-templates-community-testing\0c\0enabled
 qubes-templates-community\0c\0enabled"""
 
 
-MINIMAL = """qubes-dom0-current-testing\0c\0disabled
-qubes-dom0-security-testing\0c\0disabled
-qubes-dom0-current\0c\0enabled
-qubes-templates-itl-testing\0c\0disabled
-qubes-templates-itl\0c\0enabled
-qubes-templates-community-testing\0c\0disabled
-qubes-templates-community\0c\0disabled"""
-
-
-MISSING = """qubes-dom0-current\0c\0enabled"""
-
+REPOS_ALL_ENABLED = {
+    'qubes-dom0-current-testing': True,
+    'qubes-dom0-security-testing': True,
+    'qubes-dom0-current': True,
+    'qubes-templates-itl-testing': True,
+    'qubes-templates-itl': True,
+    'qubes-templates-community-testing': True,
+    'qubes-templates-community': True,
+}
+
+
+REPOS_MINIMAL = {
+    'qubes-dom0-current-testing': False,
+    'qubes-dom0-security-testing': False,
+    'qubes-dom0-current': True,
+    'qubes-templates-itl-testing': False,
+    'qubes-templates-itl': True,
+    'qubes-templates-community-testing': False,
+    'qubes-templates-community': False,
+}
+
+
+REPOS_MISSING = {'qubes-dom0-current': True}
+
+
+class FakeRepoClient:
+    """Repository client that keeps repository states in memory instead of
+    calling qrexec services; changes made through it are recorded in
+    changes. If fail is True, all calls fail like a failed qrexec call."""
+    def __init__(self, repo_states: Dict[str, bool], fail: bool = False):
+        # build the listing once, in the same format QubesRepoClient uses
+        self.repos = {repo: {'prettyname': 'c', 'enabled': enabled}
+                      for repo, enabled in repo_states.items()}
+        self.fail = fail
+        self.changes: Dict[str, bool] = {}
+
+    def list_repos(self) -> Dict[str, Dict]:
+        if self.fail:
+            raise RuntimeError('qrexec call failed')
+        return {repo: dict(data) for repo, data in self.repos.items()}
+
+    def set_repository(self, repository: str, state: bool):
+        if self.fail:
+            raise RuntimeError('qrexec call failed')
+        self.repos.setdefault(repository, {'prettyname': 'c'})
+        self.repos[repository]['enabled'] = state
+        self.changes[repository] = state
+
+
+ENABLE_SET_SAVE = frozenset({'qubes-dom0-current', 'qubes-templates-itl'})
+DISABLE_SET_SAVE = frozenset({'qubes-dom0-current-testing',
+                              'qubes-templates-itl-testing'})
+
+
+class RepoSubprocessMock:
+    """Replacement for subprocess.run faking the qubes.repos.* services:
+    List returns repo_list, Enable and Disable only succeed for the
+    provided repos."""
+    def __init__(self, repo_list, enable_repos=frozenset(),
+                 disable_repos=frozenset()):
+        self.repo_list = repo_list
+        self.enable_repos = frozenset(enable_repos)
+        self.disable_repos = frozenset(disable_repos)
+        self._dispatch = {
+            '/etc/qubes-rpc/qubes.repos.List': self._list,
+            '/etc/qubes-rpc/qubes.repos.Enable':
+                partial(self._set_repo, self.enable_repos),
+            '/etc/qubes-rpc/qubes.repos.Disable':
+                partial(self._set_repo, self.disable_repos),
+        }
+
+    def __call__(self, command, *_args, **_kwargs):
+        sudo, cmd, arg = command
+        assert sudo == 'sudo'
+        assert cmd in self._dispatch, f'Unexpected command: {cmd}'
+        return self._dispatch[cmd](arg)
+
+    def _list(self, _arg):
+        return MockProcess(self.repo_list, 0, None)
+
+    @staticmethod
+    def _set_repo(allowed_repos, repo):
+        assert repo in allowed_repos, f'Unexpected repo change: {repo}'
+        return MockProcess(b'ok\n', 0, None)
 
-def subprocess_replace(repo_list, command, *_args, **_kwargs):
-    sudo, cmd, _ = command
-    assert sudo == 'sudo'
-
-    if cmd == '/etc/qubes-rpc/qubes.repos.List':
-        output = repo_list
-        return MockProcess(output.encode(), 0, None)
-
-    assert False
 
 def subprocess_fail(_command, *_args, **_kwargs):
     return MockProcess(b'', 2, b'2')
 
 
-@patch('subprocess.run', partial(subprocess_replace, ALL_ENABLED))
-def test_repo_handler_all(real_builder):
-    handler = RepoHandler(real_builder)
-    assert handler.dom0_testing_radio.get_active()
-    assert handler.template_official_testing.get_active()
-    assert handler.template_official.get_active()
-    assert handler.template_community.get_active()
-    assert handler.template_community_testing.get_active()
-
-
-@patch('subprocess.run', partial(subprocess_replace, MINIMAL))
-def test_repo_handler_minimal(real_builder):
-    handler = RepoHandler(real_builder)
-    assert handler.dom0_stable_radio.get_active()
-    assert not handler.template_official_testing.get_active()
-    assert handler.template_official.get_active()
-    assert not handler.template_community_testing.get_active()
-    assert not handler.template_community.get_active()
-    assert not handler.template_community_testing.get_sensitive()
-
-
-@patch('subprocess.run', partial(subprocess_replace, MISSING))
-def test_repo_handler_missing_repos(real_builder):
-    handler = RepoHandler(real_builder)
-    assert handler.dom0_stable_radio.get_active()
-    assert not handler.template_official_testing.get_active()
-    assert handler.template_official.get_active()
-    assert not handler.template_community_testing.get_active()
-    assert not handler.template_community.get_active()
-    assert not handler.template_community_testing.get_sensitive()
-
-
-@patch('subprocess.run', subprocess_fail)
-def test_repo_handler_error(real_builder):
-    handler = RepoHandler(real_builder)
-    assert not handler.dom0_stable_radio.get_sensitive()
-    assert not handler.dom0_testing_sec_radio.get_sensitive()
-    assert not handler.dom0_testing_radio.get_sensitive()
-    assert not handler.template_official_testing.get_sensitive()
-    assert not handler.template_community.get_sensitive()
-    assert not handler.template_community_testing.get_sensitive()
-    assert handler.problems_repo_box.get_visible()
-
-
-def subprocess_save_repos(command, repo_list ="",
-                          enable_repos = None, disable_repos = None, **_kwargs):
-    sudo, cmd, arg = command
-    assert sudo == 'sudo'
-
-    if cmd == '/etc/qubes-rpc/qubes.repos.List':
-        output = repo_list
-        return MockProcess(output.encode(), 0, None)
-
-    if cmd == '/etc/qubes-rpc/qubes.repos.Enable':
-        if enable_repos and arg in enable_repos:
-            return MockProcess(b'ok\n', 0, None)
-
-    if cmd == '/etc/qubes-rpc/qubes.repos.Disable':
-        if disable_repos and arg in disable_repos:
-            return MockProcess(b'ok\n', 0, None)
-
-    assert False
+@pytest.fixture
+def fake_subprocess(monkeypatch):
+    """Replace subprocess.run with the provided function until the end
+    of the test"""
+    def _replace(replacement):
+        monkeypatch.setattr(subprocess, 'run', replacement)
+    return _replace
+
+
+def test_repo_client_list(fake_subprocess):
+    fake_subprocess(RepoSubprocessMock(FULL_LIST))
+    repos = QubesRepoClient().list_repos()
+
+    assert len(repos) == 7
+    assert repos['qubes-dom0-current-testing'] == \
+           {'prettyname': 'c', 'enabled': False}
+    assert repos['qubes-templates-community'] == \
+           {'prettyname': 'c', 'enabled': True}
+
+
+def test_repo_client_set(fake_subprocess):
+    fake_subprocess(RepoSubprocessMock(FULL_LIST,
+                                       enable_repos=ENABLE_SET_SAVE,
+                                       disable_repos=DISABLE_SET_SAVE))
+    client = QubesRepoClient()
+
+    for repo in ENABLE_SET_SAVE:
+        client.set_repository(repo, True)
+    for repo in DISABLE_SET_SAVE:
+        client.set_repository(repo, False)
+
+
+def test_repo_client_fail(fake_subprocess):
+    fake_subprocess(subprocess_fail)
+    client = QubesRepoClient()
+
+    with pytest.raises(RuntimeError):
+        client.list_repos()
+    with pytest.raises(RuntimeError):
+        client.set_repository('qubes-dom0-current', True)
+
+
+@pytest.mark.parametrize('repo_states, expected', [
+    (REPOS_ALL_ENABLED, {
+        ('dom0_testing_radio', 'active'): True,
+        ('template_official_testing', 'active'): True,
+        ('template_official', 'active'): True,
+        ('template_community', 'active'): True,
+        ('template_community_testing', 'active'): True}),
+    (REPOS_MINIMAL, {
+        ('dom0_stable_radio', 'active'): True,
+        ('template_official_testing', 'active'): False,
+        ('template_official', 'active'): True,
+        ('template_community_testing', 'active'): False,
+        ('template_community', 'active'): False,
+        ('template_community_testing', 'sensitive'): False}),
+    (REPOS_MISSING, {
+        ('dom0_stable_radio', 'active'): True,
+        ('template_official_testing', 'active'): False,
+        ('template_official', 'active'): True,
+        ('template_community_testing', 'active'): False,
+        ('template_community', 'active'): False,
+        ('template_community_testing', 'sensitive'): False}),
+    # None means the repo list call fails
+    (None, {
+        ('dom0_stable_radio', 'sensitive'): False,
+        ('dom0_testing_sec_radio', 'sensitive'): False,
+        ('dom0_testing_radio', 'sensitive'): False,
+        ('template_official_testing', 'sensitive'): False,
+        ('template_community', 'sensitive'): False,
+        ('template_community_testing', 'sensitive'): False,
+        ('problems_repo_box', 'visible'): True}),
+], ids=['all', 'minimal', 'missing', 'error'])
+def test_repo_handler_state(real_builder, repo_states, expected):
+    handler = RepoHandler(real_builder, repo_client=FakeRepoClient(
+        repo_states or {}, fail=repo_states is None))
+
+    for (widget_name, state), value in expected.items():
+        widget = getattr(handler, widget_name)
+        assert getattr(widget, f'get_{state}')() == value, \
+            f'{widget_name} is not {state}={value}'
 
 
 def test_repo_handler_save(real_builder):
-
-    with patch('subprocess.run', partial(
-            subprocess_save_repos, repo_list=ALL_ENABLED)):
-        handler = RepoHandler(real_builder)
+    client = FakeRepoClient(REPOS_ALL_ENABLED)
+    handler = RepoHandler(real_builder, repo_client=client)
 
     handler.dom0_stable_radio.set_active(True)
     handler.template_community_testing.set_active(False)
     handler.template_official_testing.set_active(False)
 
-    changed_result = """qubes-dom0-current-testing\0c\0disabled
-qubes-dom0-security-testing\0c\0disabled
-qubes-dom0-current\0c\0enabled
-qubes-templates-itl-testing\0c\0disabled
-qubes-templates-itl\0c\0enabled
-qubes-templates-community-testing\0c\0disabled
-qubes-templates-community\0c\0enabled"""
+    handler.save()
 
-    with patch('subprocess.run', partial(
-            subprocess_save_repos, repo_list=changed_result,
-            enable_repos=['qubes-dom0-current',
-                          'qubes-templates-itl',
-                          'qubes-templates-community',],
-            disable_repos=['qubes-dom0-security-testing',
-                           'qubes-dom0-current-testing',
-                           'qubes-templates-itl-testing',
-                           'qubes-templates-community-testing'])):
-        handler.save()
+    assert client.changes == {
+        'qubes-dom0-current': True,
+        'qubes-dom0-security-testing': False,
+        'qubes-dom0-current-testing': False,
+        'qubes-templates-itl-testing': False,
+        'qubes-templates-itl': True,
+        'qubes-templates-community': True,
+        'qubes-templates-community-testing': False}
 
 
 def test_repo_handler_save_fail(real_builder):
-    with patch('subprocess.run', partial(
-            subprocess_save_repos, repo_list=ALL_ENABLED)):
-        handler = RepoHandler(real_builder)
+    client = FakeRepoClient(REPOS_ALL_ENABLED)
+    handler = RepoHandler(real_builder, repo_client=client)
 
     handler.dom0_stable_radio.set_active(True)
 
-    with patch('subprocess.run', subprocess_fail):
-        with pytest.raises(qubesadmin.exc.QubesException):
-            handler.save()
+    client.fail = True
+    with pytest.raises(qubesadmin.exc.QubesException):
+        handler.save()
+
 
-@patch('subprocess.run', partial(subprocess_replace, MINIMAL))
 def test_repo_handler_unsaved(real_builder):
-    handler = RepoHandler(real_builder)
+    handler = RepoHandler(real_builder,
+                          repo_client=FakeRepoClient(REPOS_MINIMAL))
 
     assert handler.get_unsaved() == ''
 
@@ -225,28 +374,25 @@ def test_repo_handler_unsaved(real_builder):
     assert handler.get_unsaved() == ''
 
 
-def test_updates_checker_dom0(real_builder, test_qapp):
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x001'
+def test_updates_checker_dom0(real_builder, test_qapp, update_check_calls):
+    update_check_calls({'dom0': True})
     handler = UpdateCheckerHandler(real_builder, test_qapp)
     assert handler.dom0_update_check.get_active()
 
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                          'service.qubes-update-check', None)] = \
-    b'0\x00'
+    update_check_calls({'dom0': False})
     handler = UpdateCheckerHandler(real_builder, test_qapp)
     assert not handler.dom0_update_check.get_active()
 
     # default for this feature is Enabled
     test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                          'service.qubes-update-check', None)] = \
-    b'2\x00QubesFeatureNotFoundError\x00\x00feature1\x00'
+                              'service.qubes-update-check', None)] = \
+        UPDATE_CHECK_NOT_FOUND
     handler = UpdateCheckerHandler(real_builder, test_qapp)
     assert handler.dom0_update_check.get_active()
 
 
-def test_updates_checker_init_state(real_builder, test_qapp):
+def test_updates_checker_init_state(real_builder, test_qapp,
+                                    update_check_calls):
     # initial values for all vms are feature not found
     handler = UpdateCheckerHandler(real_builder, test_qapp)
 
@@ -255,56 +401,38 @@ def test_updates_checker_init_state(real_builder, test_qapp):
     assert not handler.flowbox_handler.selected_vms
 
     # disable enable check for 2 vms, explicitly enable for one
-    test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
+    update_check_calls({'test-vm': True,
+                        'test-red': False, 'test-blue': False})
     handler = UpdateCheckerHandler(real_builder, test_qapp)
     assert handler.enable_radio.get_active()
     assert handler.exceptions_check.get_active()
     assert handler.flowbox_handler.selected_vms == \
            [test_qapp.domains['test-blue'], test_qapp.domains['test-red']]
 
-def test_updates_checker_init_disabled(real_builder, test_qapp):
+def test_updates_checker_init_disabled(real_builder, test_qapp,
+                                       update_check_calls, all_vm_names):
     # set default to disabled (remember system default is still enabled)
     # disable it in two qubes explicitly
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'config.default.qubes-update-check', None)] = \
-        b'0\x00'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
+    update_check_calls({'dom0': False},
+                       feature='config.default.qubes-update-check')
+    update_check_calls({'test-red': False, 'test-blue': False})
     # names for easier comparison in case of errors
-    expected_qubes = [vm.name for vm in test_qapp.domains
-                      if vm.name not in ['test-red', 'test-blue', 'dom0']]
+    expected_qubes = sorted(all_vm_names - {'test-red', 'test-blue', 'dom0'})
     handler = UpdateCheckerHandler(real_builder, test_qapp)
     assert handler.disable_radio.get_active()
     assert handler.exceptions_check.get_active()
-    assert [str(vm) for vm in handler.flowbox_handler.selected_vms] == \
+    assert sorted(str(vm) for vm in handler.flowbox_handler.selected_vms) == \
            expected_qubes
 
 
-def test_updates_checker_exceptions(real_builder, test_qapp):
+def test_updates_checker_exceptions(real_builder, test_qapp,
+                                    update_check_calls):
     # explicit enable in one vm, explicit disable in one vm
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
+    update_check_calls({'test-red': True, 'test-blue': False})
     # no default
     test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
                               'config.default.qubes-update-check', None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00config.default.' \
-        b'qubes-update-check\x00'
+        DEFAULT_UPDATE_CHECK_NOT_FOUND
 
     disabled_vms = ['test-blue']
 
@@ -325,40 +453,48 @@ def test_updates_checker_exceptions(real_builder, test_qapp):
     assert [str(vm) for vm in handler.flowbox_handler.selected_vms] == \
            disabled_vms
 
-def test_updates_checker_get_unsaved(real_builder, test_qapp):
+def _apply(handler: UpdateCheckerHandler, action: str):
+    """Apply a named user action to an UpdateCheckerHandler"""
+    widget_name, state = {
+        'dom0_off': ('dom0_update_check', False),
+        'dom0_on': ('dom0_update_check', True),
+        'disable': ('disable_radio', True),
+        'enable': ('enable_radio', True),
+    }[action]
+    getattr(handler, widget_name).set_active(state)
+
+
+@pytest.mark.parametrize('actions, must_contain, must_not_contain', [
+    ([], [], ['dom0', 'Default']),
+    (['dom0_off'], ['dom0'], ['Default']),
+    (['dom0_off', 'dom0_on'], [], ['dom0', 'Default']),
+    (['disable'], ['Default'], ['dom0']),
+    (['disable', 'enable'], [], ['dom0', 'Default']),
+    (['disable', 'dom0_off'], ['dom0', 'Default'], []),
+])
+def test_updates_checker_get_unsaved(real_builder, test_qapp, actions,
+                                     must_contain, must_not_contain):
     handler = UpdateCheckerHandler(real_builder, test_qapp)
 
-    assert handler.get_unsaved() == ""
+    for action in actions:
+        _apply(handler, action)
 
-    handler.dom0_update_check.set_active(False)
-    assert 'dom0' in handler.get_unsaved()
+    unsaved = handler.get_unsaved()
+    if not must_contain:
+        assert unsaved == ""
+    for text in must_contain:
+        assert text in unsaved
+    for text in must_not_contain:
+        assert text not in unsaved
 
-    handler.dom0_update_check.set_active(True)
-    assert handler.get_unsaved() == ""
 
-    handler.disable_radio.set_active(True)
-    assert 'Default' in handler.get_unsaved()
-    handler.enable_radio.set_active(True)
-    assert handler.get_unsaved() == ""
-
-    handler.disable_radio.set_active(True)
-    handler.dom0_update_check.set_active(False)
-    assert 'dom0' in handler.get_unsaved()
-    assert 'Default' in handler.get_unsaved()
-
-
-def test_updates_checker_get_unsaved_choice(real_builder, test_qapp):
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
+def test_updates_checker_get_unsaved_choice(real_builder, test_qapp,
+                                            update_check_calls):
+    update_check_calls({'test-red': True, 'test-blue': False})
     # no default
     test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
                               'config.default.qubes-update-check', None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00config.default.' \
-        b'qubes-update-check\x00'
+        DEFAULT_UPDATE_CHECK_NOT_FOUND
 
     handler = UpdateCheckerHandler(real_builder, test_qapp)
 
@@ -387,8 +523,8 @@ def test_updates_checker_get_unsaved_choice(real_builder, test_qapp):
 
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_updates_checker_save_dom0(mock_feature, real_builder, test_qapp):
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+def test_updates_checker_save_dom0(mock_feature, make_update_checker):
+    handler = make_update_checker()
 
     handler.dom0_update_check.set_active(False)
     handler.save()
@@ -399,32 +535,24 @@ def test_updates_checker_save_dom0(mock_feature, real_builder, test_qapp):
 
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_updates_checker_save_dom0_initial_none(mock_feature,
-                                                real_builder, test_qapp):
+def test_updates_checker_save_dom0_initial_none(mock_feature, test_qapp,
+                                                make_update_checker):
     test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
                               UpdateCheckerHandler.FEATURE_NAME, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00service.' \
-        b'qubes-update-check\x00'
+        UPDATE_CHECK_NOT_FOUND
 
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+    handler = make_update_checker()
 
     handler.dom0_update_check.set_active(True)
     handler.save()
 
     # nothing should have been changed
-    assert not mock_feature.mock_calls
+    mock_feature.assert_not_called()
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_updates_checker_save_add_exception(mock_feature,
-                                                real_builder, test_qapp):
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'config.default.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+def test_updates_checker_save_add_exception(mock_feature, test_qapp,
+                                            make_update_checker):
+    handler = make_update_checker({'test-red': False}, default=True)
     handler.flowbox_handler.add_selected_vm(test_qapp.domains['test-blue'])
     handler.save()
 
@@ -436,25 +564,14 @@ def test_updates_checker_save_add_exception(mock_feature,
 @patch('qubes_config.global_config.vm_flowbox.ask_question')
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
 def test_updates_checker_save_del_exception(mock_feature,
-                                            mock_question,
-                                            real_builder, test_qapp):
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'config.default.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+                                            mock_question, test_qapp,
+                                            make_update_checker):
+    handler = make_update_checker({'test-red': False, 'test-blue': False},
+                                  default=True)
 
     mock_question.return_value = Gtk.ResponseType.YES
-    for child in handler.flowbox_handler.flowbox.get_children():
-        if hasattr(child, 'vm') and str(child.vm) == 'test-blue':
-            child._remove_self()
-    assert mock_question.mock_calls
+    handler.flowbox_handler.find_button_for_vm('test-blue')._remove_self()
+    assert mock_question.called
     handler.save()
 
     assert len(mock_feature.mock_calls) == 1
@@ -463,16 +580,9 @@ def test_updates_checker_save_del_exception(mock_feature,
 
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_updates_checker_save_change_default(mock_feature,
-                                            real_builder, test_qapp):
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'config.default.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+def test_updates_checker_save_change_default(mock_feature, test_qapp,
+                                             make_update_checker):
+    handler = make_update_checker({'test-red': False}, default=True)
     handler.disable_radio.set_active(True)
     handler.exceptions_check.set_active(True)
 
@@ -480,36 +590,24 @@ def test_updates_checker_save_change_default(mock_feature,
     handler.flowbox_handler.add_selected_vm(test_qapp.domains['test-blue'])
 
     handler.save()
-    assert call(test_qapp.domains['dom0'],
-                'config.default.qubes-update-check', False) \
-           in mock_feature.mock_calls
-    counter = 1
-
-    for vm in test_qapp.domains:
-        if vm.klass == 'AdminVM':
-            continue
-        if vm.name == 'test-blue':
-            # this vm wasn't actually changed
-            continue
-        state = False if vm.name != 'test-red' else None
-        assert call(vm, handler.FEATURE_NAME, state) in mock_feature.mock_calls
-        counter += 1
-
-    assert len(mock_feature.mock_calls) == counter
 
-@patch('qubes_config.global_config.vm_flowbox.ask_question')
-def test_updates_check_reset(mock_question, real_builder, test_qapp):
-    test_qapp.expected_calls[('dom0', 'admin.vm.feature.Get',
-                              'config.default.qubes-update-check', None)] = \
-        b'0\x001'
-    test_qapp.expected_calls[('test-red', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
-    test_qapp.expected_calls[('test-blue', 'admin.vm.feature.Get',
-                              'service.qubes-update-check', None)] = \
-        b'0\x00'
+    # mock calls are not hashable, but their arguments are;
+    # test-blue is skipped, as it wasn't actually changed
+    expected_args = {
+        (vm, handler.FEATURE_NAME, None if vm.name == 'test-red' else False)
+        for vm in test_qapp.domains
+        if vm.klass != 'AdminVM' and vm.name != 'test-blue'}
+    expected_args.add((test_qapp.domains['dom0'],
+                       'config.default.qubes-update-check', False))
 
-    handler = UpdateCheckerHandler(real_builder, test_qapp)
+    actual_args = [c.args for c in mock_feature.call_args_list]
+    assert set(actual_args) == expected_args
+    assert len(actual_args) == len(expected_args)
+
+@patch('qubes_config.global_config.vm_flowbox.ask_question')
+def test_updates_check_reset(mock_question, test_qapp, make_update_checker):
+    handler = make_update_checker({'test-red': False, 'test-blue': False},
+                                  default=True)
 
     # make some changes
     handler.dom0_update_check.set_active(False)
@@ -518,10 +616,8 @@ def test_updates_check_reset(mock_question, real_builder, test_qapp):
     handler.flowbox_handler.add_selected_vm(test_qapp.domains['test-vm'])
 
     mock_question.return_value = Gtk.ResponseType.YES
-    for child in handler.flowbox_handler.flowbox.get_children():
-        if hasattr(child, 'vm') and str(child.vm) == 'test-blue':
-            child._remove_self()
-    assert mock_question.mock_calls
+    handler.flowbox_handler.find_button_for_vm('test-blue')._remove_self()
+    assert mock_question.called
 
     # reset
     handler.reset()
@@ -557,102 +653,84 @@ def test_update_proxy_init_whonix(real_builder, test_qapp_whonix,
     assert handler.whonix_updatevm_box.get_visible()
 
 
-def test_update_proxy_init_policy_no_whonix(real_builder, test_qapp,
-                                  test_policy_manager):
-    policy = """
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-"""
-    test_policy_manager.policy_client.policy_replace('proxy-file', policy)
-
-    handler = UpdateProxy(real_builder, test_qapp, test_policy_manager,
-                          'proxy-file', 'Proxy')
-    assert not handler.has_whonix
-    assert handler.updatevm_model.get_selected() == 'sys-firewall'
-
-
-def test_update_proxy_init_policy_whonix_new(real_builder, test_qapp_whonix,
-                                  test_policy_manager):
-    policy = """
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-"""
+@pytest.mark.parametrize('qapp_fixture, policy, expected', [
+    ('test_qapp', POLICY_TEMPLATEVM,
+     {'has_whonix': False, 'updatevm': 'sys-firewall',
+      'whonix_updatevm': None, 'exceptions': []}),
+    ('test_qapp_whonix', POLICY_TEMPLATEVM,
+     {'has_whonix': True, 'updatevm': 'sys-firewall',
+      'whonix_updatevm': 'sys-whonix', 'exceptions': []}),
+    ('test_qapp_whonix', POLICY_WHONIX,
+     {'has_whonix': True, 'updatevm': 'sys-firewall',
+      'whonix_updatevm': 'anon-whonix', 'exceptions': []}),
+    ('test_qapp_whonix', POLICY_EXCEPTION,
+     {'has_whonix': True, 'updatevm': 'sys-firewall',
+      'whonix_updatevm': 'anon-whonix',
+      'exceptions': [('fedora-36', 'sys-net')]}),
+], ids=['no_whonix', 'whonix_new', 'whonix', 'exception'])
+def test_update_proxy_init_policy(request, real_builder, test_policy_manager,
+                                  qapp_fixture, policy, expected):
+    qapp = request.getfixturevalue(qapp_fixture)
     test_policy_manager.policy_client.policy_replace('proxy-file', policy)
 
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
-    assert handler.has_whonix
-    assert handler.updatevm_model.get_selected() == 'sys-firewall'
-    assert handler.whonix_updatevm_model.get_selected() == 'sys-whonix'
-
-
-def test_update_proxy_init_policy_whonix(real_builder, test_qapp_whonix,
-                                  test_policy_manager):
-    policy = """
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
-"""
-    test_policy_manager.policy_client.policy_replace('proxy-file', policy)
-
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
-    assert handler.has_whonix
-    assert handler.updatevm_model.get_selected() == 'sys-firewall'
-    assert handler.whonix_updatevm_model.get_selected() == 'anon-whonix'
-
-
-def test_update_proxy_init_policy_exc(real_builder, test_qapp_whonix,
-                                      test_policy_manager):
-    policy = """
-Proxy * fedora-36 @default allow target=sys-net
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
-"""
-    test_policy_manager.policy_client.policy_replace('proxy-file', policy)
-
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
-    assert handler.has_whonix
-    assert handler.updatevm_model.get_selected() == 'sys-firewall'
-    assert handler.whonix_updatevm_model.get_selected() == 'anon-whonix'
-    assert len(handler.current_exception_rules) == 1
-
-    for rule in handler.current_exception_rules:
-        assert rule.source == 'fedora-36'
-        assert rule.target == 'sys-net'
-
-    assert len(handler.updatevm_exception_list.get_children()) == 1
-
-def test_update_proxy_add_exception(real_builder, test_qapp_whonix,
-                                  test_policy_manager):
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
+    handler = UpdateProxy(real_builder, qapp, test_policy_manager,
                           'proxy-file', 'Proxy')
+    assert handler.has_whonix == expected['has_whonix']
+    assert handler.updatevm_model.get_selected() == expected['updatevm']
+    if expected['whonix_updatevm']:
+        assert handler.whonix_updatevm_model.get_selected() == \
+               expected['whonix_updatevm']
+
+    assert [(rule.source, rule.target)
+            for rule in handler.current_exception_rules] == \
+           expected['exceptions']
+    assert len(handler.updatevm_exception_list.get_children()) == \
+           len(expected['exceptions'])
+
+
+@pytest.fixture
+def make_update_proxy(real_builder, test_qapp_whonix, test_policy_manager):
+    """Factory for UpdateProxy handlers using the whonix test qapp and
+    the 'proxy-file' policy file, optionally with provided policy text"""
+    def _make(policy: Optional[str] = None) -> UpdateProxy:
+        if policy is not None:
+            test_policy_manager.policy_client.policy_replace('proxy-file',
+                                                             policy)
+        return UpdateProxy(real_builder, test_qapp_whonix,
+                           test_policy_manager, 'proxy-file', 'Proxy')
+    return _make
+
+
+def test_update_proxy_add_exception(make_update_proxy, test_qapp_whonix):
+    handler = make_update_proxy()
 
     assert not handler.current_exception_rules
     handler.add_updatevm_rule_button.clicked()
 
-    for child in handler.updatevm_exception_list.get_children():
-        assert isinstance(child, NoActionListBoxRow)
-        if not child.editing:
-            assert False # wait where is a non-edited row from??
-        # source should have not-networked vms
-        fedora36 = test_qapp_whonix.domains['fedora-36']
-        sysnet = test_qapp_whonix.domains['sys-net']
-        assert child.source_widget.model.is_vm_available(fedora36)
-        assert not child.source_widget.model.is_vm_available(sysnet)
+    children = handler.updatevm_exception_list.get_children()
+    assert len(children) == 1
+    child = children[0]
+    assert child.editing
+    # source should have not-networked vms
+    fedora36 = test_qapp_whonix.domains['fedora-36']
+    sysnet = test_qapp_whonix.domains['sys-net']
+    assert child.source_widget.model.is_vm_available(fedora36)
+    assert not child.source_widget.model.is_vm_available(sysnet)
 
-        # target should have only providing-network vms
-        assert child.target_widget.model.is_vm_available(sysnet)
-        assert not child.target_widget.model.is_vm_available(fedora36)
+    # target should have only providing-network vms
+    assert child.target_widget.model.is_vm_available(sysnet)
+    assert not child.target_widget.model.is_vm_available(fedora36)
 
-        # select stuff
-        child.source_widget.model.select_value('fedora-36')
-        child.target_widget.model.select_value('sys-net')
+    # select stuff
+    child.source_widget.model.select_value('fedora-36')
+    child.target_widget.model.select_value('sys-net')
 
-        child.validate_and_save()
+    child.validate_and_save()
 
-    desired_rules = test_policy_manager.text_to_rules(
-        "Proxy * fedora-36 @default allow target=sys-net")
+    desired_rules = [str(rule) for rule in parse_rules(
+        "Proxy * fedora-36 @default allow target=sys-net")]
     assert [str(rule.raw_rule) for rule in handler.current_exception_rules] == \
-           [str(rule) for rule in desired_rules]
+           desired_rules
 
     # if I keep clicking add, I won't get random useless rules
     handler.add_updatevm_rule_button.clicked()
@@ -665,35 +743,32 @@ def test_update_proxy_add_exception(real_builder, test_qapp_whonix,
     handler.close_all_edits()
 
     assert [str(rule.raw_rule) for rule in handler.current_exception_rules] == \
-           [str(rule) for rule in desired_rules]
+           desired_rules
 
-def test_update_proxy_add_exception_err(real_builder, test_qapp_whonix,
-                                  test_policy_manager):
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
+def test_update_proxy_add_exception_err(make_update_proxy):
+    handler = make_update_proxy()
     handler.add_updatevm_rule_button.clicked()
 
     # can't add update proxy without anon-gateway for whonix vm
-    for child in handler.updatevm_exception_list.get_children():
-        assert isinstance(child, NoActionListBoxRow)
-        if not child.editing:
-            assert False # wait where is a non-edited row from??
-
-        assert child.source_widget.model.is_vm_available('whonix-gw-15')
-        assert child.target_widget.model.is_vm_available('sys-net')
-        child.source_widget.model.select_value('whonix-gw-15')
-        child.target_widget.model.select_value('sys-net')
-
-        with patch('qubes_config.global_config.rule_list_widgets.show_error') \
-            as mock_error:
-            child.validate_and_save()
-            assert mock_error.mock_calls
+    children = handler.updatevm_exception_list.get_children()
+    assert len(children) == 1
+    child = children[0]
+    assert child.editing
+
+    assert child.source_widget.model.is_vm_available('whonix-gw-15')
+    assert child.target_widget.model.is_vm_available('sys-net')
+    child.source_widget.model.select_value('whonix-gw-15')
+    child.target_widget.model.select_value('sys-net')
+
+    with patch('qubes_config.global_config.rule_list_widgets.show_error') \
+        as mock_error:
+        child.validate_and_save()
+        assert mock_error.called
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_update_proxy_save_updatevm(mock_feature, real_builder,
-                                    test_qapp_whonix, test_policy_manager):
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
+def test_update_proxy_save_updatevm(mock_feature, make_update_proxy,
+                                    test_qapp_whonix):
+    handler = make_update_proxy()
 
     assert handler.has_whonix
     assert handler.updatevm_model.get_selected() == 'sys-net'
@@ -708,37 +783,28 @@ def test_update_proxy_save_updatevm(mock_feature, real_builder,
     with patch.object(handler.policy_manager, 'save_rules') as mock_save:
         handler.save()
 
-        expected_rules = handler.policy_manager.text_to_rules(
-"""Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-""")
+        expected_rules = parse_rules(POLICY_SAVED_UPDATEVM)
         assert len(mock_save.mock_calls) == 1
         file, rules, arg = mock_save.mock_calls[0].args
         assert arg is None
         assert file == 'proxy-file'
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
+        assert tuple(map(str, expected_rules)) == tuple(map(str, rules))
 
         assert len(mock_feature.mock_calls) == 4
-        assert call(test_qapp_whonix.domains['sys-firewall'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['anon-whonix'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-whonix'],
-                    'service.qubes-updates-proxy', None) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-net'],
-                    'service.qubes-updates-proxy', None) in \
-               mock_feature.mock_calls
+        # mock calls are not hashable, but their arguments are
+        expected_values = {'sys-firewall': True, 'anon-whonix': True,
+                           'sys-whonix': None, 'sys-net': None}
+        expected_args = {(test_qapp_whonix.domains[name],
+                          'service.qubes-updates-proxy', value)
+                         for name, value in expected_values.items()}
+        assert expected_args <= \
+               {c.args for c in mock_feature.call_args_list}
 
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_update_proxy_save_justwhonix(mock_feature, real_builder,
-                                      test_qapp_whonix, test_policy_manager):
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
+def test_update_proxy_save_justwhonix(mock_feature, make_update_proxy,
+                                      test_qapp_whonix):
+    handler = make_update_proxy()
 
     assert handler.has_whonix
     assert handler.updatevm_model.get_selected() == 'sys-net'
@@ -750,82 +816,62 @@ def test_update_proxy_save_justwhonix(mock_feature, real_builder,
     with patch.object(handler.policy_manager, 'save_rules') as mock_save:
         handler.save()
 
-        expected_rules = handler.policy_manager.text_to_rules(
-"""Proxy * @tag:whonix-updatevm @default allow target=anon-whonix
-Proxy * @type:TemplateVM @default allow target=sys-net
-""")
+        expected_rules = parse_rules(POLICY_SAVED_WHONIX)
         assert len(mock_save.mock_calls) == 1
         file, rules, arg = mock_save.mock_calls[0].args
         assert arg is None
         assert file == 'proxy-file'
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
+        assert tuple(map(str, expected_rules)) == tuple(map(str, rules))
 
         assert len(mock_feature.mock_calls) == 3
-        assert call(test_qapp_whonix.domains['anon-whonix'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-net'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-whonix'],
-                    'service.qubes-updates-proxy', None) in \
-               mock_feature.mock_calls
+        # mock calls are not hashable, but their arguments are
+        expected_values = {'anon-whonix': True, 'sys-net': True,
+                           'sys-whonix': None}
+        expected_args = {(test_qapp_whonix.domains[name],
+                          'service.qubes-updates-proxy', value)
+                         for name, value in expected_values.items()}
+        assert expected_args <= \
+               {c.args for c in mock_feature.call_args_list}
 
 
 @patch('qubes_config.global_config.updates_handler.apply_feature_change')
-def test_update_proxy_save_add_rule(mock_feature, real_builder,
-                                    test_qapp_whonix, test_policy_manager):
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
+def test_update_proxy_save_add_rule(mock_feature, make_update_proxy,
+                                    test_qapp_whonix):
+    handler = make_update_proxy()
 
     handler.add_updatevm_rule_button.clicked()
-    for child in handler.updatevm_exception_list.get_children():
-        assert isinstance(child, NoActionListBoxRow)
-        if not child.editing:
-            assert False # wait where is a non-edited row from??
-        # select stuff
-        child.source_widget.model.select_value('fedora-36')
-        child.target_widget.model.select_value('sys-firewall')
-        child.validate_and_save()
+    row = handler.get_editing_row()
+    assert row
+    # select stuff
+    row.source_widget.model.select_value('fedora-36')
+    row.target_widget.model.select_value('sys-firewall')
+    row.validate_and_save()
+    # the saved row is no longer edited
+    assert handler.get_editing_row() is None
 
     with patch.object(handler.policy_manager, 'save_rules') as mock_save:
         handler.save()
 
-        expected_rules = handler.policy_manager.text_to_rules(
-            """Proxy * fedora-36 @default allow target=sys-firewall
-Proxy * @tag:whonix-updatevm @default allow target=sys-whonix
-Proxy * @type:TemplateVM @default allow target=sys-net
-""")
+        expected_rules = parse_rules(POLICY_SAVED_EXCEPTION)
         assert len(mock_save.mock_calls) == 1
         file, rules, arg = mock_save.mock_calls[0].args
         assert arg is None
         assert file == 'proxy-file'
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
+        assert tuple(map(str, expected_rules)) == tuple(map(str, rules))
 
         assert len(mock_feature.mock_calls) == 3
-        assert call(test_qapp_whonix.domains['sys-whonix'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-firewall'],
-                    'service.qubes-updates-proxy', True) in \
-               mock_feature.mock_calls
-        assert call(test_qapp_whonix.domains['sys-net'],
-                    'service.qubes-updates-proxy', True) in \
-            mock_feature.mock_calls
-
-
-def test_update_proxy_reset(real_builder, test_qapp_whonix,
-                                  test_policy_manager):
-    policy = """
-Proxy * fedora-36 @default allow target=sys-net
-Proxy * @type:TemplateVM @default allow target=sys-firewall
-Proxy * @tag:whonix-updatevm @default allow target=anon-whonix"""
-    test_policy_manager.policy_client.policy_replace('proxy-file', policy)
-
-    handler = UpdateProxy(real_builder, test_qapp_whonix, test_policy_manager,
-                          'proxy-file', 'Proxy')
+        # mock calls are not hashable, but their arguments are
+        expected_values = {'sys-whonix': True, 'sys-firewall': True,
+                           'sys-net': True}
+        expected_args = {(test_qapp_whonix.domains[name],
+                          'service.qubes-updates-proxy', value)
+                         for name, value in expected_values.items()}
+        assert expected_args <= \
+               {c.args for c in mock_feature.call_args_list}
+
+
+def test_update_proxy_reset(make_update_proxy, test_qapp_whonix):
+    handler = make_update_proxy(POLICY_EXCEPTION)
     assert handler.has_whonix
     assert handler.updatevm_model.get_selected() == 'sys-firewall'
     assert handler.whonix_updatevm_model.get_selected() == 'anon-whonix'
@@ -846,17 +892,12 @@ Proxy * @tag:whonix-updatevm @default allow target=anon-whonix"""
 
     # add exception
     handler.add_updatevm_rule_button.clicked()
-    for child in handler.updatevm_exception_list.get_children():
-        assert isinstance(child, NoActionListBoxRow)
-        if not child.editing:
-            continue
-        # select stuff
-        child.source_widget.model.select_value('fedora-35')
-        child.target_widget.model.select_value('sys-firewall')
-        child.validate_and_save()
-        break
-    else:
-        assert False  # edited row not found
+    row = handler.get_editing_row()
+    assert row
+    # select stuff
+    row.source_widget.model.select_value('fedora-35')
+    row.target_widget.model.select_value('sys-firewall')
+    row.validate_and_save()
 
     assert handler.is_changed()
 
@@ -21,118 +21,208 @@
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-class-docstring
 # pylint: disable=protected-access
+# pylint: disable=redefined-outer-name
 
-from unittest.mock import patch, call
+from operator import attrgetter
+from types import SimpleNamespace
+from unittest.mock import patch, call, DEFAULT, MagicMock
+
+import pytest
 
 from ..global_config.usb_devices import WidgetWithButtons, USBVMHandler, \
     InputDeviceHandler, U2FPolicyHandler, DevicesHandler
 from ..global_config.rule_list_widgets import VMWidget
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk
 
 
-def test_widget_with_buttons(test_qapp):
+SERVICE_NOT_FOUND = b'2\x00QubesFeatureNotFoundError\x00\x00' + \
+    U2FPolicyHandler.SERVICE_FEATURE.encode() + b'\x00'
+
+NO_SERVICE_TESTVM = {
+    ('test-vm', 'admin.vm.feature.Get',
+     U2FPolicyHandler.SERVICE_FEATURE, None): SERVICE_NOT_FOUND}
+
+NO_SUPPORT_SYSUSB = {
+    ('sys-usb', 'admin.vm.feature.CheckWithTemplate',
+     U2FPolicyHandler.SUPPORTED_SERVICE_FEATURE, None): SERVICE_NOT_FOUND}
+
+SERVICE_FEDORA35 = {
+    ('fedora-35', 'admin.vm.feature.Get',
+     U2FPolicyHandler.SERVICE_FEATURE, None): b'0\x001'}
+
+POLICY_REGISTER_SOME = """
+policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
+u2f.Register * fedora-35 sys-usb allow
+u2f.Register * test-vm sys-usb allow
+u2f.Authenticate * test-vm sys-usb allow
+"""
+
+POLICY_REGISTER_ALL = """
+policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
+u2f.Register * @anyvm sys-usb allow
+"""
+
+
+def _assert_state(handler, expected):
+    """Check handler state; expected is a dict of attribute path: value,
+    where callables (like get_active) are called and lists of qubes are
+    compared by name"""
+    for path, value in expected.items():
+        actual = attrgetter(path)(handler)
+        if callable(actual):
+            actual = actual()
+        if isinstance(actual, list):
+            actual = [str(vm) for vm in actual]
+        assert actual == value, path
+
+
+def _assert_rules_equal(rules, expected_policy: str):
+    """Compare rules with expected policy text line by line, ignoring
+    whitespace differences and empty lines"""
+    expected = [' '.join(line.split())
+                for line in expected_policy.splitlines() if line.strip()]
+    assert [' '.join(str(rule).split()) for rule in rules] == expected
+
+
+def _change_widget(widget: WidgetWithButtons, value: str):
+    """Change widget value like the user would: click edit, select value
+    and confirm"""
+    widget.edit_button.clicked()
+    widget.select_widget.model.select_value(value)
+    widget.confirm_button.clicked()
+
+
+@pytest.fixture
+def vms(test_qapp):
+    """Qubes from test_qapp used by the tests, looked up once per test"""
+    return SimpleNamespace(
+        dom0=test_qapp.domains['dom0'],
+        testvm=test_qapp.domains['test-vm'],
+        testblue=test_qapp.domains['test-blue'],
+        testred=test_qapp.domains['test-red'],
+        fedora35=test_qapp.domains['fedora-35'],
+        sys_usb=test_qapp.domains['sys-usb'],
+        sys_net=test_qapp.domains['sys-net'])
+
+
+@pytest.fixture
+def u2f_handler(test_qapp, test_policy_manager, real_builder, vms):
+    """U2FPolicyHandler with the default settings from conftest"""
+    return U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
+                            vms.sys_usb)
+
+
+@pytest.fixture
+def mock_apply():
+    """Patch out feature changes made by usb_devices handlers for the
+    duration of the test"""
+    with patch.multiple('qubes_config.global_config.usb_devices',
+                        apply_feature_change=DEFAULT,
+                        apply_feature_change_from_widget=DEFAULT) as mocks:
+        yield SimpleNamespace(**mocks)
+
+
+@pytest.fixture
+def mock_save_rules(test_policy_manager):
+    """Patch out saving rules by test_policy_manager"""
+    with patch.object(test_policy_manager, 'save_rules') as mock_save:
+        yield mock_save
+
+
+def _assert_editable(widget: VMWidget, editable: bool):
+    """Check if the widget shows the combobox (when editable) or the
+    plain name (when not)"""
+    assert widget.combobox.props.visible == editable
+    assert widget.name_widget.props.visible != editable
+
+
+def test_widget_with_buttons(test_qapp, vms):
     simple_widget = VMWidget(qapp=test_qapp, categories=None,
                              initial_value='test-vm')
 
     test_widget = WidgetWithButtons(simple_widget)
 
-    assert not simple_widget.combobox.get_visible()
-    assert simple_widget.name_widget.get_visible()
+    _assert_editable(simple_widget, False)
     assert not test_widget.is_changed()
 
     # edit
     test_widget.edit_button.clicked()
 
-    assert simple_widget.combobox.get_visible()
-    assert not simple_widget.name_widget.get_visible()
+    _assert_editable(simple_widget, True)
 
     # change
-    assert simple_widget.model.is_vm_available(test_qapp.domains['test-blue'])
+    assert simple_widget.model.is_vm_available(vms.testblue)
     simple_widget.model.select_value('test-blue')
 
     # cancel
     test_widget.cancel_button.clicked()
     assert not test_widget.is_changed()
 
-    assert not simple_widget.combobox.get_visible()
-    assert simple_widget.name_widget.get_visible()
-    assert simple_widget.get_selected() == test_qapp.domains['test-vm']
+    _assert_editable(simple_widget, False)
+    assert simple_widget.get_selected() == vms.testvm
 
     # change and confirm
-    assert simple_widget.model.is_vm_available(test_qapp.domains['test-blue'])
+    assert simple_widget.model.is_vm_available(vms.testblue)
     simple_widget.model.select_value('test-blue')
     test_widget.confirm_button.clicked()
 
-    assert not simple_widget.combobox.get_visible()
-    assert simple_widget.name_widget.get_visible()
-    assert simple_widget.get_selected() == test_qapp.domains['test-blue']
+    _assert_editable(simple_widget, False)
+    assert simple_widget.get_selected() == vms.testblue
     assert test_widget.is_changed()
 
     # revert
 
     test_widget.reset()
-    assert not simple_widget.combobox.get_visible()
-    assert simple_widget.name_widget.get_visible()
-    assert simple_widget.get_selected() == test_qapp.domains['test-vm']
+    _assert_editable(simple_widget, False)
+    assert simple_widget.get_selected() == vms.testvm
     assert not test_widget.is_changed()
 
     # change, save and update initial
-    assert simple_widget.model.is_vm_available(test_qapp.domains['test-blue'])
+    assert simple_widget.model.is_vm_available(vms.testblue)
     simple_widget.model.select_value('test-blue')
     test_widget.confirm_button.clicked()
     test_widget.update_changed()
     assert not test_widget.is_changed()
 
     test_widget.reset()
-    assert not simple_widget.combobox.get_visible()
-    assert simple_widget.name_widget.get_visible()
-    assert simple_widget.get_selected() == test_qapp.domains['test-blue']
+    _assert_editable(simple_widget, False)
+    assert simple_widget.get_selected() == vms.testblue
 
 
 # this is just a fairly basic test, crucial for usbvm is how it interacts
 # with other places
-def test_usbvm_handler(test_qapp, real_builder):
+def test_usbvm_handler(test_qapp, vms, real_builder, mock_apply):
     handler = USBVMHandler(test_qapp, real_builder)
 
     # try making some changes
-    handler.widget_with_buttons.edit_button.clicked()
-    handler.widget_with_buttons.select_widget.model.select_value('sys-net')
-    handler.widget_with_buttons.confirm_button.clicked()
+    _change_widget(handler.widget_with_buttons, 'sys-net')
 
     assert handler.get_unsaved() == "USB qube"
-    assert handler.get_selected_usbvm() == test_qapp.domains['sys-net']
+    assert handler.get_selected_usbvm() == vms.sys_net
 
     # and revert
     handler.reset()
-    assert handler.get_selected_usbvm() == test_qapp.domains['sys-usb']
+    assert handler.get_selected_usbvm() == vms.sys_usb
     assert handler.get_unsaved() == ""
 
 
     # change and save
-    handler.widget_with_buttons.edit_button.clicked()
-    handler.widget_with_buttons.select_widget.model.select_value('sys-net')
-    handler.widget_with_buttons.confirm_button.clicked()
+    _change_widget(handler.widget_with_buttons, 'sys-net')
 
-    with patch('qubes_config.global_config.usb_devices.'
-               'apply_feature_change_from_widget') as mock_apply:
-        handler.save()
-        mock_apply.assert_called_with(
-            handler.select_widget, test_qapp.domains['dom0'],
-            handler.FEATURE_NAME)
+    handler.save()
+    mock_apply.apply_feature_change_from_widget.assert_called_with(
+        handler.select_widget, vms.dom0, handler.FEATURE_NAME)
 
     # things look correct
-    assert handler.get_selected_usbvm() == test_qapp.domains['sys-net']
+    assert handler.get_selected_usbvm() == vms.sys_net
     assert handler.get_unsaved() == ""
 
 
-def test_input_devices_no_policy(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
+def test_input_devices_no_policy(test_qapp, test_policy_manager, real_builder,
+                                 vms, mock_save_rules):
     handler = InputDeviceHandler(test_qapp, test_policy_manager,
-                                 real_builder, sys_usb)
+                                 real_builder, vms.sys_usb)
 
     # check if defaults worked
     for widget in handler.action_widgets.values():
@@ -142,9 +232,7 @@ def test_input_devices_no_policy(test_qapp, test_policy_manager, real_builder):
 
     mouse_widget = handler.action_widgets[
         'qubes.InputMouse']
-    mouse_widget.edit_button.clicked()
-    mouse_widget.select_widget.model.select_value('ask')
-    mouse_widget.confirm_button.clicked()
+    _change_widget(mouse_widget, 'ask')
 
     assert mouse_widget.select_widget.get_selected() == 'ask'
     assert handler.get_unsaved() == 'Mouse input settings'
@@ -157,379 +245,239 @@ def test_input_devices_no_policy(test_qapp, test_policy_manager, real_builder):
     # change and save
     mouse_widget = handler.action_widgets[
         'qubes.InputMouse']
-    mouse_widget.edit_button.clicked()
-    mouse_widget.select_widget.model.select_value('ask')
-    mouse_widget.confirm_button.clicked()
+    _change_widget(mouse_widget, 'ask')
 
-    with patch.object(handler.policy_manager, 'save_rules') as mock_save:
-        handler.save()
+    handler.save()
 
-        expected_rules = handler.policy_manager.text_to_rules(
-"""qubes.InputMouse * sys-usb @adminvm ask
+    mock_save_rules.assert_called_once()
+    rules = mock_save_rules.call_args.args[1]
+    _assert_rules_equal(rules, """
+qubes.InputMouse * sys-usb @adminvm ask
 qubes.InputKeyboard * sys-usb @adminvm deny
 qubes.InputTablet * sys-usb @adminvm deny
 """)
-        assert len(mock_save.mock_calls) == 1
-        _, rules, _ = mock_save.mock_calls[0].args
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
 
 
-def test_u2f_handler_init(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    assert handler.get_unsaved() == ''
+def test_u2f_handler_init(vms, u2f_handler):
+    assert u2f_handler.get_unsaved() == ''
 
     # settings from conftest: only vms that have this available are 'test-vm'
-    # and 'fedora-35', only test-vm can use the service, policy is default
-    testvm = test_qapp.domains['test-vm']
-    testred = test_qapp.domains['test-red']
-    fedora35 = test_qapp.domains['fedora-35']
-    sysusb = test_qapp.domains['sys-usb']
-
-    assert handler.enable_check.get_active()
-    assert handler.enable_some_handler.selected_vms == [testvm]
-    assert handler.enable_some_handler.add_qube_model.is_vm_available(testvm)
-    assert handler.enable_some_handler.add_qube_model.is_vm_available(fedora35)
-    assert not handler.enable_some_handler.add_qube_model.is_vm_available(
-        testred)
-    assert not handler.enable_some_handler.add_qube_model.is_vm_available(
-        sysusb)
-
-    assert not handler.register_check.get_active()
-    assert not handler.register_some_handler.selected_vms
-
-    assert not handler.blanket_check.get_active()
-    assert not handler.blanket_handler.selected_vms
-
-
-def test_u2f_handler_init_disable(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Get',
-                             U2FPolicyHandler.SERVICE_FEATURE, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00' + \
-        str(U2FPolicyHandler.SERVICE_FEATURE).encode() + b'\x00'
-
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    assert not handler.enable_check.get_active()
-    assert not handler.problem_no_usbvm_box.get_visible()
-
-
-def test_u2f_handler_init_no_sysub(
-        test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    test_qapp.expected_calls[
-        ('sys-usb', 'admin.vm.feature.CheckWithTemplate',
-         U2FPolicyHandler.SUPPORTED_SERVICE_FEATURE, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00' + \
-        str(U2FPolicyHandler.SERVICE_FEATURE).encode() + b'\x00'
-
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    assert not handler.enable_check.get_active()
-    assert handler.problem_no_usbvm_box.get_visible()
-
-
-def test_u2f_handler_init_policy(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    fedora35 = test_qapp.domains['fedora-35']
-    testvm = test_qapp.domains['test-vm']
-    test_qapp.expected_calls[('fedora-35', 'admin.vm.feature.Get',
-                             U2FPolicyHandler.SERVICE_FEATURE, None)] = \
-        b'0\x001'
-
-    test_policy_manager.policy_client.files['50-config-u2f'] = """
-policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
-u2f.Register * fedora-35 sys-usb allow
-u2f.Register * test-vm sys-usb allow
-u2f.Authenticate * test-vm sys-usb allow
-"""
-    test_policy_manager.policy_client.file_tokens['50-config-u2f'] = '55'
-
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    assert handler.enable_check.get_active()
-    assert handler.enable_some_handler.selected_vms == [fedora35, testvm]
-
-    assert handler.register_check.get_active()
-    assert handler.register_some_radio.get_active()
-    assert handler.register_some_handler.selected_vms == [fedora35, testvm]
-
-    assert handler.blanket_check.get_active()
-    assert handler.blanket_handler.selected_vms == [testvm]
-
-
-def test_u2f_handler_init_policy_2(test_qapp,
-                                   test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    fedora35 = test_qapp.domains['fedora-35']
-    testvm = test_qapp.domains['test-vm']
-    test_qapp.expected_calls[('fedora-35', 'admin.vm.feature.Get',
-                             U2FPolicyHandler.SERVICE_FEATURE, None)] = \
-        b'0\x001'
-
-    test_policy_manager.policy_client.files['50-config-u2f'] = """
-policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
-u2f.Register * @anyvm sys-usb allow
-"""
-    test_policy_manager.policy_client.file_tokens['50-config-u2f'] = '55'
+    # and 'fedora-35'
+    add_qube_model = u2f_handler.enable_some_handler.add_qube_model
+    assert add_qube_model.is_vm_available(vms.testvm)
+    assert add_qube_model.is_vm_available(vms.fedora35)
+    assert not add_qube_model.is_vm_available(vms.testred)
+    assert not add_qube_model.is_vm_available(vms.sys_usb)
+
+
+@pytest.mark.parametrize('extra_calls, policy, expected', [
+    # settings from conftest: only test-vm can use the service,
+    # policy is default
+    ({}, None,
+     {'enable_check.get_active': True,
+      'enable_some_handler.selected_vms': ['test-vm'],
+      'register_check.get_active': False,
+      'register_some_handler.selected_vms': [],
+      'blanket_check.get_active': False,
+      'blanket_handler.selected_vms': []}),
+    (NO_SERVICE_TESTVM, None,
+     {'enable_check.get_active': False,
+      'problem_no_usbvm_box.get_visible': False}),
+    (NO_SUPPORT_SYSUSB, None,
+     {'enable_check.get_active': False,
+      'problem_no_usbvm_box.get_visible': True}),
+    (SERVICE_FEDORA35, POLICY_REGISTER_SOME,
+     {'enable_check.get_active': True,
+      'enable_some_handler.selected_vms': ['fedora-35', 'test-vm'],
+      'register_check.get_active': True,
+      'register_some_radio.get_active': True,
+      'register_some_handler.selected_vms': ['fedora-35', 'test-vm'],
+      'blanket_check.get_active': True,
+      'blanket_handler.selected_vms': ['test-vm']}),
+    (SERVICE_FEDORA35, POLICY_REGISTER_ALL,
+     {'enable_check.get_active': True,
+      'enable_some_handler.selected_vms': ['fedora-35', 'test-vm'],
+      'register_check.get_active': True,
+      'register_all_radio.get_active': True,
+      'blanket_check.get_active': False}),
+], ids=['default', 'disable', 'no_sysusb', 'policy', 'policy_2'])
+def test_u2f_handler_init_state(test_qapp, test_policy_manager, real_builder,
+                                vms, extra_calls, policy, expected):
+    test_qapp.expected_calls.update(extra_calls)
+    if policy is not None:
+        test_policy_manager.policy_client.policy_replace('50-config-u2f',
+                                                         policy)
 
     handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
+                               vms.sys_usb)
 
-    assert handler.enable_check.get_active()
-    assert handler.enable_some_handler.selected_vms == [fedora35, testvm]
+    _assert_state(handler, expected)
 
-    assert handler.register_check.get_active()
-    assert handler.register_all_radio.get_active()
 
-    assert not handler.blanket_check.get_active()
+def test_u2f_unsaved_reset(vms, u2f_handler):
+    assert u2f_handler.enable_check.get_active()
+    assert not u2f_handler.register_check.get_active()
+    assert not u2f_handler.blanket_check.get_active()
+    assert u2f_handler.enable_some_handler.selected_vms == [vms.testvm]
 
+    u2f_handler.enable_check.set_active(False)
+    assert u2f_handler.get_unsaved() == 'U2F disabled'
 
-def test_u2f_unsaved_reset(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-    testvm = test_qapp.domains['test-vm']
-    fedora35 = test_qapp.domains['fedora-35']
+    u2f_handler.enable_check.set_active(True)
+    assert u2f_handler.get_unsaved() == ''
 
-    assert handler.enable_check.get_active()
-    assert not handler.register_check.get_active()
-    assert not handler.blanket_check.get_active()
-    assert handler.enable_some_handler.selected_vms == [testvm]
+    assert u2f_handler.enable_check.get_active()
+    assert not u2f_handler.register_check.get_active()
+    assert not u2f_handler.blanket_check.get_active()
 
-    handler.enable_check.set_active(False)
-    assert handler.get_unsaved() == 'U2F disabled'
+    u2f_handler.enable_some_handler.add_selected_vm(vms.fedora35)
+    assert u2f_handler.enable_some_handler.selected_vms == \
+           [vms.fedora35, vms.testvm]
+    assert u2f_handler.get_unsaved() == 'List of qubes with U2F enabled changed'
 
-    handler.enable_check.set_active(True)
-    assert handler.get_unsaved() == ''
+    u2f_handler.reset()
+    assert u2f_handler.enable_check.get_active()
+    assert not u2f_handler.register_check.get_active()
+    assert not u2f_handler.blanket_check.get_active()
+    assert u2f_handler.enable_some_handler.selected_vms == [vms.testvm]
+    assert u2f_handler.get_unsaved() == ''
 
-    assert handler.enable_check.get_active()
-    assert not handler.register_check.get_active()
-    assert not handler.blanket_check.get_active()
+    u2f_handler.blanket_check.set_active(True)
+    u2f_handler.register_check.set_active(True)
+    u2f_handler.register_some_radio.set_active(True)
+    u2f_handler.blanket_handler.add_selected_vm(vms.fedora35)
+    u2f_handler.register_some_handler.add_selected_vm(vms.fedora35)
 
-    handler.enable_some_handler.add_selected_vm(fedora35)
-    assert handler.enable_some_handler.selected_vms == [fedora35, testvm]
-    assert handler.get_unsaved() == 'List of qubes with U2F enabled changed'
+    assert u2f_handler.blanket_handler.selected_vms == [vms.fedora35]
+    assert u2f_handler.register_some_handler.selected_vms == [vms.fedora35]
+    assert 'U2F key registration' in u2f_handler.get_unsaved()
+    assert 'unrestricted U2F key' in u2f_handler.get_unsaved()
 
-    handler.reset()
-    assert handler.enable_check.get_active()
-    assert not handler.register_check.get_active()
-    assert not handler.blanket_check.get_active()
-    assert handler.enable_some_handler.selected_vms == [testvm]
-    assert handler.get_unsaved() == ''
+    u2f_handler.reset()
+    assert u2f_handler.get_unsaved() == ''
+    assert u2f_handler.blanket_handler.selected_vms == []
+    assert u2f_handler.register_some_handler.selected_vms == []
 
-    handler.blanket_check.set_active(True)
-    handler.register_check.set_active(True)
-    handler.register_some_radio.set_active(True)
-    handler.blanket_handler.add_selected_vm(fedora35)
-    handler.register_some_handler.add_selected_vm(fedora35)
+def test_u2f_save_disable(vms, u2f_handler, mock_apply, mock_save_rules):
+    u2f_handler.enable_check.set_active(False)
 
-    assert handler.blanket_handler.selected_vms == [fedora35]
-    assert handler.register_some_handler.selected_vms == [fedora35]
-    assert 'U2F key registration' in handler.get_unsaved()
-    assert 'unrestricted U2F key' in handler.get_unsaved()
+    u2f_handler.save()
 
-    handler.reset()
-    assert handler.get_unsaved() == ''
-    assert handler.blanket_handler.selected_vms == []
-    assert handler.register_some_handler.selected_vms == []
-
-def test_u2f_save_disable(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    handler.enable_check.set_active(False)
-
-    with patch.object(handler.policy_manager, 'save_rules') as mock_save, \
-            patch('qubes_config.global_config.usb_devices.'
-               'apply_feature_change') as mock_apply:
-        handler.save()
-
-        mock_apply.assert_called_with(
-            test_qapp.domains['test-vm'], handler.SERVICE_FEATURE, None)
-        assert len(mock_apply.mock_calls) == 1
+    mock_apply.apply_feature_change.assert_called_once_with(
+        vms.testvm, u2f_handler.SERVICE_FEATURE, None)
 
-        expected_rules = handler.policy_manager.text_to_rules(
-            """
+    mock_save_rules.assert_called_once()
+    rules = mock_save_rules.call_args.args[1]
+    _assert_rules_equal(rules, """
 u2f.Authenticate * @anyvm @anyvm deny
 u2f.Register * @anyvm @anyvm deny
 policy.RegisterArgument +u2f.Register @anyvm @anyvm deny
 """)
-        assert len(mock_save.mock_calls) == 1
-        _, rules, _ = mock_save.mock_calls[0].args
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
 
 
-def test_u2f_save_service(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-    fedora35 = test_qapp.domains['fedora-35']
-
-    assert handler.enable_check.get_active()
-    handler.enable_some_handler.add_selected_vm(fedora35)
+def test_u2f_save_service(test_qapp, vms, u2f_handler, mock_save_rules):
+    assert u2f_handler.enable_check.get_active()
+    u2f_handler.enable_some_handler.add_selected_vm(vms.fedora35)
 
-    test_qapp.expected_calls[('fedora-35', 'admin.vm.feature.Set',
-                              'service.qubes-u2f-proxy', b'1')] = b'0\x00'
-    test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Set',
-                              'service.qubes-u2f-proxy', b'1')] = b'0\x00'
+    test_qapp.expected_calls.update({
+        ('fedora-35', 'admin.vm.feature.Set',
+         'service.qubes-u2f-proxy', b'1'): b'0\x00',
+        ('test-vm', 'admin.vm.feature.Set',
+         'service.qubes-u2f-proxy', b'1'): b'0\x00'})
 
-    with patch.object(handler.policy_manager, 'save_rules') as mock_save:
-        handler.save()
+    u2f_handler.save()
 
-        expected_rules = handler.policy_manager.text_to_rules(
-            """
+    mock_save_rules.assert_called_once()
+    rules = mock_save_rules.call_args.args[1]
+    _assert_rules_equal(rules, """
 u2f.Register * @anyvm @anyvm deny
 policy.RegisterArgument +u2f.Register @anyvm @anyvm deny
 """)
-        assert len(mock_save.mock_calls) == 1
-        _, rules, _ = mock_save.mock_calls[0].args
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
-
-def test_u2f_handler_save_complex(test_qapp, test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    testvm = test_qapp.domains['test-vm']
-    fedora35 = test_qapp.domains['fedora-35']
-    test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Get',
-                             U2FPolicyHandler.SERVICE_FEATURE, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00' + \
-        str(U2FPolicyHandler.SERVICE_FEATURE).encode() + b'\x00'
 
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
-
-    assert not handler.enable_check.get_active()
-
-    handler.enable_check.set_active(True)
-    handler.enable_some_handler.add_selected_vm(testvm)
-    handler.enable_some_handler.add_selected_vm(fedora35)
-
-    handler.register_check.set_active(True)
-    handler.register_all_radio.set_active(True)
-
-    handler.blanket_check.set_active(True)
-    handler.blanket_handler.add_selected_vm(testvm)
-
-    with patch.object(handler.policy_manager, 'save_rules') as mock_save, \
-            patch('qubes_config.global_config.usb_devices.'
-               'apply_feature_change') as mock_apply:
-        handler.save()
-
-        assert call(test_qapp.domains['test-vm'],
-                    handler.SERVICE_FEATURE, True) in mock_apply.mock_calls
-        assert call(test_qapp.domains['fedora-35'],
-                    handler.SERVICE_FEATURE, True) in mock_apply.mock_calls
-        assert len(mock_apply.mock_calls) == 2
-
-        expected_rules = handler.policy_manager.text_to_rules(
-            """
+@pytest.mark.parametrize('register_some, blanket, expected_policy', [
+    # None means the "register all" radio / disabled blanket access
+    (None, ['test-vm'], """
 policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
 u2f.Register * @anyvm sys-usb allow
 u2f.Authenticate * test-vm sys-usb allow
-""")
-        assert len(mock_save.mock_calls) == 1
-        _, rules, _ = mock_save.mock_calls[0].args
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
-
-
-def test_u2f_handler_save_complex_2(test_qapp,
-                                    test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    testvm = test_qapp.domains['test-vm']
-    fedora35 = test_qapp.domains['fedora-35']
-    test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Get',
-                             U2FPolicyHandler.SERVICE_FEATURE, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00' + \
-        str(U2FPolicyHandler.SERVICE_FEATURE).encode() + b'\x00'
+"""),
+    (['fedora-35', 'test-vm'], None, """
+u2f.Register * fedora-35 sys-usb allow
+u2f.Register * test-vm sys-usb allow
+policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
+"""),
+], ids=['register_all', 'register_some'])
+def test_u2f_handler_save_complex(test_qapp, test_policy_manager, real_builder,
+                                  vms, mock_apply, mock_save_rules,
+                                  register_some, blanket, expected_policy):
+    test_qapp.expected_calls.update(NO_SERVICE_TESTVM)
 
     handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
+                               vms.sys_usb)
 
     assert not handler.enable_check.get_active()
 
     handler.enable_check.set_active(True)
-    handler.enable_some_handler.add_selected_vm(testvm)
-    handler.enable_some_handler.add_selected_vm(fedora35)
+    handler.enable_some_handler.add_selected_vm(vms.testvm)
+    handler.enable_some_handler.add_selected_vm(vms.fedora35)
 
     handler.register_check.set_active(True)
-    handler.register_some_radio.set_active(True)
-    handler.register_some_handler.add_selected_vm(fedora35)
-    handler.register_some_handler.add_selected_vm(testvm)
+    if register_some is None:
+        handler.register_all_radio.set_active(True)
+    else:
+        handler.register_some_radio.set_active(True)
+        for vm_name in register_some:
+            handler.register_some_handler.add_selected_vm(
+                test_qapp.domains[vm_name])
 
-    handler.blanket_check.set_active(False)
+    handler.blanket_check.set_active(blanket is not None)
+    for vm_name in blanket or []:
+        handler.blanket_handler.add_selected_vm(test_qapp.domains[vm_name])
 
-    with patch.object(handler.policy_manager, 'save_rules') as mock_save, \
-            patch('qubes_config.global_config.usb_devices.'
-               'apply_feature_change') as mock_apply:
-        handler.save()
+    handler.save()
 
-        assert call(test_qapp.domains['test-vm'],
-                    handler.SERVICE_FEATURE, True) in mock_apply.mock_calls
-        assert call(test_qapp.domains['fedora-35'],
-                    handler.SERVICE_FEATURE, True) in mock_apply.mock_calls
-        assert len(mock_apply.mock_calls) == 2
+    mock_apply.apply_feature_change.assert_has_calls(
+        [call(vms.testvm, handler.SERVICE_FEATURE, True),
+         call(vms.fedora35, handler.SERVICE_FEATURE, True)], any_order=True)
+    assert mock_apply.apply_feature_change.call_count == 2
 
-        expected_rules = handler.policy_manager.text_to_rules(
-            """
-u2f.Register * fedora-35 sys-usb allow
-u2f.Register * test-vm sys-usb allow
-policy.RegisterArgument +u2f.Register sys-usb @anyvm allow target=dom0
-""")
-        assert len(mock_save.mock_calls) == 1
-        _, rules, _ = mock_save.mock_calls[0].args
-        assert [str(rule) for rule in expected_rules] == \
-               [str(rule) for rule in rules]
-
-def test_u2f_handler_add_without_service(test_qapp,
-                                         test_policy_manager, real_builder):
-    sys_usb = test_qapp.domains['sys-usb']
-    fedora35 = test_qapp.domains['fedora-35']
-    testvm = test_qapp.domains['test-vm']
-    handler = U2FPolicyHandler(test_qapp, test_policy_manager, real_builder,
-                               sys_usb)
+    mock_save_rules.assert_called_once()
+    rules = mock_save_rules.call_args.args[1]
+    _assert_rules_equal(rules, expected_policy)
 
-    assert handler.get_unsaved() == ''
+def test_u2f_handler_add_without_service(vms, u2f_handler):
+    assert u2f_handler.get_unsaved() == ''
 
     # settings from conftest: only vms that have this available are 'test-vm'
     # and 'fedora-35', only test-vm can use the service, policy is default
 
-    handler.register_check.set_active(True)
-    handler.register_some_radio.set_active(True)
+    u2f_handler.register_check.set_active(True)
+    u2f_handler.register_some_radio.set_active(True)
 
-    assert handler.register_some_handler.selected_vms == []
-    assert handler.enable_some_handler.selected_vms == [testvm]
+    assert u2f_handler.register_some_handler.selected_vms == []
+    assert u2f_handler.enable_some_handler.selected_vms == [vms.testvm]
 
-    handler.register_some_handler.add_button.clicked()
-    handler.register_some_handler.add_qube_model.select_value('fedora-35')
+    u2f_handler.register_some_handler.add_button.clicked()
+    u2f_handler.register_some_handler.add_qube_model.select_value('fedora-35')
     # refuse
     with patch('qubes_config.global_config.usb_devices.'
                'ask_question') as mock_question:
         mock_question.return_value = Gtk.ResponseType.NO
-        handler.register_some_handler.add_confirm.clicked()
+        u2f_handler.register_some_handler.add_confirm.clicked()
         assert mock_question.mock_calls
-    assert handler.register_some_handler.selected_vms == []
-    assert handler.enable_some_handler.selected_vms == [testvm]
+    assert u2f_handler.register_some_handler.selected_vms == []
+    assert u2f_handler.enable_some_handler.selected_vms == [vms.testvm]
 
     # accept
     with patch('qubes_config.global_config.usb_devices.'
                'ask_question') as mock_question:
         mock_question.return_value = Gtk.ResponseType.YES
-        handler.register_some_handler.add_confirm.clicked()
+        u2f_handler.register_some_handler.add_confirm.clicked()
         assert mock_question.mock_calls
-    assert handler.register_some_handler.selected_vms == [fedora35]
+    assert u2f_handler.register_some_handler.selected_vms == [vms.fedora35]
 
-    assert handler.enable_some_handler.selected_vms == [fedora35, testvm]
+    assert u2f_handler.enable_some_handler.selected_vms == \
+           [vms.fedora35, vms.testvm]
 
 
 def test_devices_handler_usbvm(test_qapp, test_policy_manager, real_builder):
@@ -539,10 +487,7 @@ def test_devices_handler_usbvm(test_qapp, test_policy_manager, real_builder):
     assert handler.input_handler.sys_usb.name == 'sys-usb'
 
     # changing usbvm
-    handler.usbvm_handler.widget_with_buttons.edit_button.clicked()
-    handler.usbvm_handler.widget_with_buttons.select_widget.model.select_value(
-        'sys-net')
-    handler.usbvm_handler.widget_with_buttons.confirm_button.clicked()
+    _change_widget(handler.usbvm_handler.widget_with_buttons, 'sys-net')
 
     assert handler.u2f_handler.sys_usb.name == 'sys-net'
     assert handler.input_handler.sys_usb.name == 'sys-net'
@@ -557,9 +502,7 @@ def test_devices_handler_unsaved(test_qapp, test_policy_manager, real_builder):
     kb_widget = handler.input_handler.action_widgets[
         'qubes.InputKeyboard']
     assert kb_widget.select_widget.get_selected() == 'deny'
-    kb_widget.edit_button.clicked()
-    kb_widget.select_widget.model.select_value('ask')
-    kb_widget.confirm_button.clicked()
+    _change_widget(kb_widget, 'ask')
 
     assert handler.u2f_handler.enable_check.get_active()
     handler.u2f_handler.enable_check.set_active(False)
@@ -568,24 +511,21 @@ def test_devices_handler_unsaved(test_qapp, test_policy_manager, real_builder):
     assert 'U2F disabled' in handler.get_unsaved()
 
 
-def test_devices_handler_save_reset(test_qapp,
-                                    test_policy_manager, real_builder):
-    handler = DevicesHandler(test_qapp, test_policy_manager, real_builder)
+def test_devices_handler_save_reset():
+    # only forwarding to child handlers is tested here, so skip building them
+    with patch.object(DevicesHandler, '__init__', return_value=None):
+        handler = DevicesHandler()
+    handler.u2f_handler = MagicMock()
+    handler.input_handler = MagicMock()
+    handler.usbvm_handler = MagicMock()
 
     # check all handlers have their save/reset called
-    with patch.object(handler.u2f_handler, 'save') as mock_u2f, \
-            patch.object(handler.input_handler, 'save') as mock_input, \
-            patch.object(handler.usbvm_handler, 'save') as mock_usb:
-        handler.save()
-        mock_input.assert_called()
-        mock_u2f.assert_called()
-        mock_usb.assert_called()
-
-
-    with patch.object(handler.u2f_handler, 'reset') as mock_u2f, \
-            patch.object(handler.input_handler, 'reset') as mock_input, \
-            patch.object(handler.usbvm_handler, 'reset') as mock_usb:
-        handler.reset()
-        mock_input.assert_called()
-        mock_u2f.assert_called()
-        mock_usb.assert_called()
+    handler.save()
+    handler.u2f_handler.save.assert_called_once()
+    handler.input_handler.save.assert_called_once()
+    handler.usbvm_handler.save.assert_called_once()
+
+    handler.reset()
+    handler.u2f_handler.reset.assert_called_once()
+    handler.input_handler.reset.assert_called_once()
+    handler.usbvm_handler.reset.assert_called_once()
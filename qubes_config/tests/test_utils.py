@@ -20,120 +20,111 @@
 # pylint: disable=missing-class-docstring
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-module-docstring
+# pylint: disable=redefined-outer-name
+from types import SimpleNamespace
+
 import pytest
 
 import qubesadmin.exc
 from ..widgets.utils import apply_feature_change, get_boolean_feature, \
     get_feature, apply_feature_change_from_widget, BiDictionary
 
-def test_get_feature(test_qapp):
-    """Test if get feature methods behave correctly, in
-    particular when setting features to None and handling boolean features."""
-    feature_name = 'test_feature'
-    default_value = 'test'
-    vm = test_qapp.domains['test-vm']
-
-    # missing feature
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Get',
-         feature_name, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00Feature not set\x00'
-    assert get_feature(vm, feature_name, default_value) == default_value
-
-    # correct feature
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Get', feature_name, None)] = \
-        b'0\0value1'
-    assert get_feature(vm, feature_name, default_value) == 'value1'
-
-    # boolean feature
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Get', feature_name, None)] = \
-        b'0\x001'
-    assert get_boolean_feature(vm, feature_name, False) is True
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Get',
-         feature_name, None)] = \
-        b'2\x00QubesFeatureNotFoundError\x00\x00Feature not set\x00'
-    assert get_boolean_feature(vm, feature_name, True) is True
-
-    # set feature
-    call = ('test-vm', 'admin.vm.feature.Set', feature_name, b'1')
-    test_qapp.expected_calls[call] = b'0\0'
-    apply_feature_change(vm, feature_name, True)
-    assert call in test_qapp.actual_calls
 
-    call = ('test-vm', 'admin.vm.feature.Set', feature_name, b'text')
+FEATURE_NAME = 'test_feature'
+FEATURE_GET = ('test-vm', 'admin.vm.feature.Get', FEATURE_NAME, None)
+FEATURE_NOT_FOUND = \
+    b'2\x00QubesFeatureNotFoundError\x00\x00Feature not set\x00'
+
+
+def test_get_feature_missing(test_qapp, test_vm):
+    test_qapp.expected_calls[FEATURE_GET] = FEATURE_NOT_FOUND
+    assert get_feature(test_vm, FEATURE_NAME, 'test') == 'test'
+
+
+def test_get_feature_value(test_qapp, test_vm):
+    test_qapp.expected_calls[FEATURE_GET] = b'0\0value1'
+    assert get_feature(test_vm, FEATURE_NAME, 'test') == 'value1'
+
+
+@pytest.mark.parametrize('raw, default, expected', [
+    (b'0\x001', False, True),
+    (FEATURE_NOT_FOUND, True, True),
+], ids=['set', 'missing'])
+def test_get_boolean_feature(test_qapp, test_vm, raw, default, expected):
+    test_qapp.expected_calls[FEATURE_GET] = raw
+    assert get_boolean_feature(test_vm, FEATURE_NAME, default) is expected
+
+
+@pytest.mark.parametrize('value, encoded', [
+    (True, b'1'),
+    ('text', b'text'),
+])
+def test_apply_feature_change_set(test_qapp, test_vm, value, encoded):
+    call = ('test-vm', 'admin.vm.feature.Set', FEATURE_NAME, encoded)
     test_qapp.expected_calls[call] = b'0\0'
-    apply_feature_change(vm, feature_name, 'text')
+    apply_feature_change(test_vm, FEATURE_NAME, value)
     assert call in test_qapp.actual_calls
 
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.List', None, None)] = \
-        b'0\x00test_feature'
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Remove', feature_name, None)] = \
-        b'0\x001'
-    apply_feature_change(vm, feature_name, None)
-    assert ('test-vm', 'admin.vm.feature.Remove', feature_name, None) \
-           in test_qapp.actual_calls
+
+def test_apply_feature_change_remove(test_qapp, test_vm):
+    remove_call = ('test-vm', 'admin.vm.feature.Remove', FEATURE_NAME, None)
+    test_qapp.expected_calls.update({
+        ('test-vm', 'admin.vm.feature.List', None, None): b'0\x00test_feature',
+        remove_call: b'0\x001'
+    })
+    apply_feature_change(test_vm, FEATURE_NAME, None)
+    assert remove_call in test_qapp.actual_calls
 
 
-def test_feature_unavailable(test_qapp):
-    feature_name = 'test_feature'
-    default_value = 'test'
-    vm = test_qapp.domains['test-vm']
+FEATURE_NOT_AVAILABLE = \
+    b'2\x00QubesDaemonAccessError\x00\x00Feature not available\x00'
 
-    # missing feature
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Get',
-         feature_name, None)] = \
-        b'2\x00QubesDaemonAccessError\x00\x00Feature not available\x00'
-    assert get_feature(vm, feature_name, default_value) == default_value
 
-    with pytest.raises(qubesadmin.exc.QubesException):
-        test_qapp.expected_calls[('test-vm', 'admin.vm.feature.Set',
-                                  feature_name, b'1')] = \
-            b'2\x00QubesDaemonAccessError\x00\x00Feature not available\x00'
-        apply_feature_change(vm, feature_name, True)
+@pytest.mark.parametrize('method, arg', [
+    ('Get', None),
+    ('Set', b'1'),
+])
+def test_feature_unavailable(test_qapp, test_vm, method, arg):
+    test_qapp.expected_calls[('test-vm', f'admin.vm.feature.{method}',
+                              FEATURE_NAME, arg)] = FEATURE_NOT_AVAILABLE
+    if method == 'Get':
+        # unavailable features are treated as missing
+        assert get_feature(test_vm, FEATURE_NAME, 'test') == 'test'
+    else:
+        with pytest.raises(qubesadmin.exc.QubesException):
+            apply_feature_change(test_vm, FEATURE_NAME, True)
 
 
-def test_apply_change_from_widget(test_qapp):
-    vm = test_qapp.domains['test-vm']
-    feature_name = 'test-feature'
+def _mock_widget(changed, value):
+    """Minimal stand-in for a widget handler with is_changed and
+    get_selected."""
+    return SimpleNamespace(is_changed=lambda: changed,
+                           get_selected=lambda: value)
 
-    class MockWidget:
-        def __init__(self, changed, value):
-            self.changed = changed
-            self.value = value
 
-        def is_changed(self):
-            return self.changed
+WIDGET_FEATURE = 'test-feature'
+WIDGET_FEATURE_LIST = ('test-vm', 'admin.vm.feature.List', None, None)
 
-        def get_selected(self):
-            return self.value
 
+@pytest.mark.parametrize('changed, value, replies', [
     # should not try to set anything
-    apply_feature_change_from_widget(MockWidget(False, None), vm, feature_name)
-
-    # set correctly
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Set', feature_name,
-         b'1')] = b'0\0'
-    apply_feature_change_from_widget(MockWidget(True, True), vm, feature_name)
-
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Set', feature_name,
-         b'text')] = b'0\0'
-    apply_feature_change_from_widget(MockWidget(True, 'text'), vm, feature_name)
-
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.List', None, None)] = \
-        b'0\x00other-feature'
-    test_qapp.expected_calls[
-        ('test-vm', 'admin.vm.feature.Remove', feature_name, None)] = \
-        b'0\x001'
-    apply_feature_change_from_widget(MockWidget(True, None), vm, feature_name)
+    (False, None, {}),
+    (True, True, {('test-vm', 'admin.vm.feature.Set', WIDGET_FEATURE, b'1'):
+                      b'0\0'}),
+    (True, 'text', {('test-vm', 'admin.vm.feature.Set', WIDGET_FEATURE,
+                     b'text'): b'0\0'}),
+    # feature not set, so nothing to remove
+    (True, None, {WIDGET_FEATURE_LIST: b'0\x00other-feature'}),
+], ids=['unchanged', 'true', 'text', 'none'])
+def test_apply_change_from_widget(test_qapp, test_vm, changed, value,
+                                  replies):
+    test_qapp.expected_calls.update(replies)
+    apply_feature_change_from_widget(
+        _mock_widget(changed, value), test_vm, WIDGET_FEATURE)
+
+    feature_calls = [c for c in test_qapp.actual_calls
+                     if c[1].startswith('admin.vm.feature.')]
+    assert feature_calls == list(replies)
 
 
 def test_bidict():
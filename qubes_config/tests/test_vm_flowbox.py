@@ -18,11 +18,10 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 # pylint: disable=missing-function-docstring,missing-module-docstring
+# pylint: disable=redefined-outer-name
 from unittest.mock import patch
 
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
+import pytest
 from gi.repository import Gtk
 
 from ..global_config.vm_flowbox import VMFlowboxHandler, \
@@ -30,6 +29,8 @@ from ..global_config.vm_flowbox import VMFlowboxHandler, \
 
 
 def get_visible_vms(flowbox_handler: VMFlowboxHandler):
+    """Return sorted list of vms with visible buttons, checking the
+    placeholder visibility in the same pass."""
     visible_vms = []
     placeholder = None
     for child in flowbox_handler.flowbox.get_children():
@@ -41,12 +42,25 @@ def get_visible_vms(flowbox_handler: VMFlowboxHandler):
             visible_vms.append(child.vm)
     assert placeholder
     assert placeholder.get_visible() != bool(visible_vms)
-    return visible_vms
+    return sorted(visible_vms)
 
 
-def test_simple_flowbox_init_empty(test_qapp, test_builder):
-    flowbox_handler = VMFlowboxHandler(
-        test_builder, test_qapp, 'flowtest', [])
+@pytest.fixture
+def empty_flowbox(test_qapp, test_builder):
+    """Flowbox handler with no initially selected vms. Function-scoped,
+    as the handler is bound to the per-test builder's widgets."""
+    return VMFlowboxHandler(test_builder, test_qapp, 'flowtest', [])
+
+
+@pytest.fixture
+def flowbox_with_vms(test_qapp, test_builder, test_vm, blue_vm):
+    """Flowbox handler with test-vm and test-blue initially selected."""
+    return VMFlowboxHandler(
+        test_builder, test_qapp, 'flowtest', initial_vms=[test_vm, blue_vm])
+
+
+def test_simple_flowbox_init_empty(empty_flowbox):
+    flowbox_handler = empty_flowbox
     assert not flowbox_handler.is_changed()
 
     assert len(flowbox_handler.flowbox.get_children()) == 1 # only placeholder
@@ -56,74 +70,48 @@ def test_simple_flowbox_init_empty(test_qapp, test_builder):
     assert not flowbox_handler.add_box.get_visible()
 
 
-def test_simple_flowbox_init_not_empty(test_qapp, test_builder):
-    initial_vms = [test_qapp.domains['test-vm'],
-                   test_qapp.domains['test-blue']]
-
-    flowbox_handler = VMFlowboxHandler(
-        test_builder, test_qapp, 'flowtest', initial_vms=initial_vms)
+def test_simple_flowbox_init_not_empty(test_vm, blue_vm, flowbox_with_vms):
+    flowbox_handler = flowbox_with_vms
+    expected_vms = sorted([test_vm, blue_vm])
 
     assert not flowbox_handler.is_changed()
 
     # placeholder plus two vms
     assert len(flowbox_handler.flowbox.get_children()) == 3
 
-    visible_vms = get_visible_vms(flowbox_handler)
-    assert sorted(visible_vms) == sorted(initial_vms)
-    assert sorted(initial_vms) == flowbox_handler.selected_vms
+    assert get_visible_vms(flowbox_handler) == expected_vms
+    assert flowbox_handler.selected_vms == expected_vms
 
-@patch('qubes_config.global_config.vm_flowbox.ask_question',
-       return_value=Gtk.ResponseType.YES)
-def test_flowbox_remove_button(mock_question, test_qapp, test_builder):
-    initial_vms = [test_qapp.domains['test-vm'],
-                   test_qapp.domains['test-blue']]
+@pytest.mark.parametrize('response, after_first, after_second', [
+    (Gtk.ResponseType.YES, ['test-blue'], []),
+    (Gtk.ResponseType.NO, ['test-blue', 'test-vm'], ['test-blue', 'test-vm']),
+], ids=['yes', 'no'])
+def test_flowbox_remove_button(flowbox_with_vms, response, after_first,
+                               after_second):
+    flowbox_handler = flowbox_with_vms
 
-    flowbox_handler = VMFlowboxHandler(
-        test_builder, test_qapp, 'flowtest', initial_vms=initial_vms)
+    with patch('qubes_config.global_config.vm_flowbox.ask_question',
+               return_value=response) as mock_question:
+        # remove test-vm
+        flowbox_handler.find_button_for_vm('test-vm').get_child().clicked()
+        assert len(mock_question.mock_calls) == 1
 
-    # remove test-vm
-    assert not mock_question.mock_calls
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child, VMFlowBoxButton) and child.vm.name == 'test-vm':
-            child.get_child().clicked()
-    assert len(mock_question.mock_calls) == 1
+        assert [vm.name for vm in get_visible_vms(flowbox_handler)] == \
+               after_first
+        assert [vm.name for vm in flowbox_handler.selected_vms] == after_first
 
-    assert get_visible_vms(flowbox_handler) == [test_qapp.domains['test-blue']]
-    assert flowbox_handler.selected_vms == [test_qapp.domains['test-blue']]
+        # remove test-blue
+        flowbox_handler.find_button_for_vm('test-blue').get_child().clicked()
+        assert len(mock_question.mock_calls) == 2
 
-    # remove test-blue
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child, VMFlowBoxButton) and child.vm.name == 'test-blue':
-            child.get_child().clicked()
-    assert len(mock_question.mock_calls) == 2
+        assert [vm.name for vm in get_visible_vms(flowbox_handler)] == \
+               after_second
+        assert [vm.name for vm in flowbox_handler.selected_vms] == \
+               after_second
 
-    assert get_visible_vms(flowbox_handler) == []
-    assert flowbox_handler.selected_vms == []
 
-
-@patch('qubes_config.global_config.vm_flowbox.ask_question',
-       return_value=Gtk.ResponseType.NO)
-def test_flowbox_remove_button_no(mock_question, test_qapp, test_builder):
-    initial_vms = [test_qapp.domains['test-vm'],
-                   test_qapp.domains['test-blue']]
-
-    flowbox_handler = VMFlowboxHandler(
-        test_builder, test_qapp, 'flowtest', initial_vms=initial_vms)
-
-    # remove test-vm
-    assert not mock_question.mock_calls
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child,
-                      VMFlowBoxButton) and child.vm.name == 'test-vm':
-            child.get_child().clicked()
-    assert len(mock_question.mock_calls) == 1
-
-    assert get_visible_vms(flowbox_handler) == sorted(initial_vms)
-    assert sorted(flowbox_handler.selected_vms) == sorted(initial_vms)
-
-
-def test_flowbox_add_vm(test_qapp, test_builder):
-    initial_vms = [test_qapp.domains['test-vm']]
+def test_flowbox_add_vm(test_qapp, test_builder, test_vm, blue_vm):
+    initial_vms = [test_vm]
 
     flowbox_handler = VMFlowboxHandler(
         test_builder, test_qapp, 'flowtest', initial_vms=initial_vms)
@@ -136,8 +124,8 @@ def test_flowbox_add_vm(test_qapp, test_builder):
     flowbox_handler.add_cancel.clicked()
 
     assert not flowbox_handler.add_box.get_visible()
-    assert sorted(flowbox_handler.selected_vms) == sorted(initial_vms)
-    assert sorted(get_visible_vms(flowbox_handler)) == sorted(initial_vms)
+    assert set(flowbox_handler.selected_vms) == {test_vm}
+    assert set(get_visible_vms(flowbox_handler)) == {test_vm}
 
     # now try to add and do not abort
     flowbox_handler.add_button.clicked()
@@ -146,10 +134,9 @@ def test_flowbox_add_vm(test_qapp, test_builder):
     flowbox_handler.add_confirm.clicked()
 
     assert not flowbox_handler.add_box.get_visible()
-    expected_vms = sorted([test_qapp.domains['test-vm'],
-                           test_qapp.domains['test-blue']])
-    assert sorted(flowbox_handler.selected_vms) == expected_vms
-    assert sorted(get_visible_vms(flowbox_handler)) == expected_vms
+    expected_vms = {test_vm, blue_vm}
+    assert set(flowbox_handler.selected_vms) == expected_vms
+    assert set(get_visible_vms(flowbox_handler)) == expected_vms
 
     # now try to add something that's already selected
     flowbox_handler.add_button.clicked()
@@ -162,84 +149,62 @@ def test_flowbox_add_vm(test_qapp, test_builder):
         assert mock_error.mock_calls
     # the box should not have hidden, maybe user wants to change selection
     assert flowbox_handler.add_box.get_visible()
-    expected_vms = sorted([test_qapp.domains['test-vm'],
-                           test_qapp.domains['test-blue']])
-    assert sorted(flowbox_handler.selected_vms) == expected_vms
-    assert sorted(get_visible_vms(flowbox_handler)) == expected_vms
+    assert set(flowbox_handler.selected_vms) == expected_vms
+    assert set(get_visible_vms(flowbox_handler)) == expected_vms
 
 
 @patch('qubes_config.global_config.vm_flowbox.ask_question',
        return_value=Gtk.ResponseType.YES)
-def test_save_reset(_mock_question, test_qapp, test_builder):
-    test_vm = test_qapp.domains['test-vm']
-    blue_vm = test_qapp.domains['test-blue']
+def test_save_reset(_mock_question, test_qapp, test_builder, test_vm,
+                    blue_vm):
 
     initial_vms = [test_vm]
 
     flowbox_handler = VMFlowboxHandler(
         test_builder, test_qapp, 'flowtest', initial_vms=initial_vms)
 
+    def assert_state(expected_vms, changed):
+        # one walk over the flowbox children per phase
+        assert flowbox_handler.selected_vms == expected_vms
+        assert get_visible_vms(flowbox_handler) == expected_vms
+        assert flowbox_handler.is_changed() == changed
+
     assert not flowbox_handler.is_changed()
 
-    # add something
+    # add something; correct vms in correct order
     flowbox_handler.add_selected_vm(blue_vm)
-    # correct vms in correct order
-    assert flowbox_handler.selected_vms == [blue_vm, test_vm]
-    assert get_visible_vms(flowbox_handler) == [blue_vm, test_vm]
-    assert flowbox_handler.is_changed()
+    assert_state([blue_vm, test_vm], True)
 
     # remove added qube
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child,
-                      VMFlowBoxButton) and child.vm == blue_vm:
-            child.get_child().clicked()
-    assert flowbox_handler.selected_vms == [test_vm]
-    assert get_visible_vms(flowbox_handler) == [test_vm]
-    assert not flowbox_handler.is_changed()
+    flowbox_handler.find_button_for_vm(blue_vm.name).get_child().clicked()
+    assert_state([test_vm], False)
 
     # remove more
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child,
-                      VMFlowBoxButton) and child.vm == test_vm:
-            child.get_child().clicked()
-    assert flowbox_handler.selected_vms == []
-    assert get_visible_vms(flowbox_handler) == []
-    assert flowbox_handler.is_changed()
+    flowbox_handler.find_button_for_vm(test_vm.name).get_child().clicked()
+    assert_state([], True)
 
     # reset to start
     flowbox_handler.reset()
-    assert flowbox_handler.selected_vms == [test_vm]
-    assert get_visible_vms(flowbox_handler) == [test_vm]
-    assert not flowbox_handler.is_changed()
-
+    assert_state([test_vm], False)
 
     # add something and save
     flowbox_handler.add_selected_vm(blue_vm)
     flowbox_handler.save()
-    assert flowbox_handler.selected_vms == [blue_vm, test_vm]
-    assert get_visible_vms(flowbox_handler) == [blue_vm, test_vm]
-    assert not flowbox_handler.is_changed()
+    assert_state([blue_vm, test_vm], False)
 
     # remove all and save
-    for child in flowbox_handler.flowbox.get_children():
-        if isinstance(child,
-                      VMFlowBoxButton) and child.vm in [blue_vm, test_vm]:
-            child.get_child().clicked()
+    for vm in [blue_vm, test_vm]:
+        flowbox_handler.find_button_for_vm(vm.name).get_child().clicked()
     flowbox_handler.save()
-    assert flowbox_handler.selected_vms == []
-    assert get_visible_vms(flowbox_handler) == []
-    assert not flowbox_handler.is_changed()
+    assert_state([], False)
 
     # add something and reset to none
     flowbox_handler.add_selected_vm(blue_vm)
     flowbox_handler.reset()
-    assert flowbox_handler.selected_vms == []
-    assert get_visible_vms(flowbox_handler) == []
-    assert not flowbox_handler.is_changed()
+    assert_state([], False)
+
 
-def test_flowbox_verify(test_qapp, test_builder):
-    test_vm = test_qapp.domains['test-vm']
-    red_vm = test_qapp.domains['test-red']
+def test_flowbox_verify(test_qapp, test_builder, test_vm, red_vm):
 
     initial_vms = [test_vm]
 
@@ -268,8 +233,7 @@ def test_flowbox_verify(test_qapp, test_builder):
     assert flowbox_handler.is_changed()
 
 
-def test_flowbox_visibility(test_qapp, test_builder):
-    test_vm = test_qapp.domains['test-vm']
+def test_flowbox_visibility(test_qapp, test_builder, test_vm):
     initial_vms = [test_vm]
 
     flowbox_handler = VMFlowboxHandler(
@@ -283,3 +247,27 @@ def test_flowbox_visibility(test_qapp, test_builder):
 
     flowbox_handler.set_visible(True)
     assert flowbox_handler.selected_vms == [test_vm]
+
+
+@patch('qubes_config.global_config.vm_flowbox.ask_question',
+       return_value=Gtk.ResponseType.YES)
+def test_flowbox_find_button(_mock_question, test_qapp, test_builder,
+                             test_vm, blue_vm):
+
+    flowbox_handler = VMFlowboxHandler(
+        test_builder, test_qapp, 'flowtest', initial_vms=[test_vm])
+
+    assert flowbox_handler.find_button_for_vm('test-vm').vm == test_vm
+    assert flowbox_handler.find_button_for_vm('test-blue') is None
+
+    flowbox_handler.add_selected_vm(blue_vm)
+    assert flowbox_handler.find_button_for_vm('test-blue').vm == blue_vm
+
+    # removed buttons should not be found anymore
+    flowbox_handler.find_button_for_vm('test-vm').get_child().clicked()
+    assert flowbox_handler.find_button_for_vm('test-vm') is None
+
+    # reset brings back initial buttons
+    flowbox_handler.reset()
+    assert flowbox_handler.find_button_for_vm('test-vm').vm == test_vm
+    assert flowbox_handler.find_button_for_vm('test-blue') is None
@@ -18,21 +18,24 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 """Utility functions using Gtk"""
-from typing import Dict, Union
+import os
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple, Union
 
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GdkPixbuf, GLib, Gdk
 
-RESPONSES_OK = {
+RESPONSES_OK = MappingProxyType({
     '_OK': Gtk.ResponseType.OK
-}
+})
 
-RESPONSES_YES_NO_CANCEL = {
+RESPONSES_YES_NO_CANCEL = MappingProxyType({
     "_Yes": Gtk.ResponseType.YES,
     "_No": Gtk.ResponseType.NO,
     "_Cancel": Gtk.ResponseType.CANCEL
-}
+})
 
 def load_icon_at_gtk_size(icon_name,
                           icon_size: Gtk.IconSize = Gtk.IconSize.LARGE_TOOLBAR):
@@ -41,32 +44,68 @@ def load_icon_at_gtk_size(icon_name,
     load a blank icon of specified size, provided as Gtk.IconSize.
     Returns GdkPixbuf.Pixbuf.
     """
-    _, width, height = Gtk.icon_size_lookup(icon_size)
+    _, width, height = _icon_size_lookup(icon_size)
     return load_icon(icon_name, width, height)
 
 
+@lru_cache(maxsize=16)
+def _icon_size_lookup(icon_size: Gtk.IconSize) -> Tuple[bool, int, int]:
+    return Gtk.icon_size_lookup(icon_size)
+
+
+# loaded icons by (icon_name, width, height); icons are only ever displayed,
+# never modified, so the same pixbuf can be safely shared
+_ICON_CACHE: Dict[Tuple[str, int, int], GdkPixbuf.Pixbuf] = {}
+
+
 def load_icon(icon_name: str, width: int = 24, height: int = 24):
     """Load icon from provided name, if available. If not, attempt to treat
     provided name as a path. If icon not found in any of the above ways,
     load a blank icon of specified size.
     Returns GdkPixbuf.Pixbuf.
     width and height must be in pixels.
+    Loaded icons are cached, so repeated calls are cheap.
     """
-    try:
-        # icon_name is a path
-        return GdkPixbuf.Pixbuf.new_from_file_at_size(icon_name, width, height)
-    except (GLib.Error, TypeError):
+    key = (icon_name, width, height)
+    if key not in _ICON_CACHE:
+        _ICON_CACHE[key] = _load_icon(icon_name, width, height)
+    return _ICON_CACHE[key]
+
+
+def _load_icon(icon_name: str, width: int, height: int) -> GdkPixbuf.Pixbuf:
+    if isinstance(icon_name, str) and os.path.isfile(icon_name):
         try:
-            # icon_name is a name
-            image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
-                icon_name, width, 0)
-            return image
-        except (TypeError, GLib.Error):
-            # icon not found in any way
-            pixbuf: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new(
-                GdkPixbuf.Colorspace.RGB, True, 8, width, height)
-            pixbuf.fill(0x000)
-            return pixbuf
+            # icon_name is a path
+            return GdkPixbuf.Pixbuf.new_from_file_at_size(
+                icon_name, width, height)
+        except GLib.Error:
+            pass
+    try:
+        # icon_name is a name
+        image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
+            icon_name, width, 0)
+        return image
+    except (TypeError, GLib.Error):
+        # icon not found in any way
+        return _blank_icon(width, height)
+
+
+# blank icons by (width, height), shared by all icons that could not be found
+_BLANK_ICON_CACHE: Dict[Tuple[int, int], GdkPixbuf.Pixbuf] = {}
+
+
+def _blank_icon(width: int, height: int) -> GdkPixbuf.Pixbuf:
+    pixbuf = _BLANK_ICON_CACHE.get((width, height))
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new(
+            GdkPixbuf.Colorspace.RGB, True, 8, width, height)
+        pixbuf.fill(0x000)
+        _BLANK_ICON_CACHE[(width, height)] = pixbuf
+    return pixbuf
+
+
+# responses whose buttons are styled as confirming the dialog
+_ACCEPT_RESPONSES = frozenset({Gtk.ResponseType.YES, Gtk.ResponseType.OK})
 
 
 def show_error(parent, title, text):
@@ -85,7 +124,7 @@ def ask_question(parent, title: str, text: str):
                        buttons=RESPONSES_YES_NO_CANCEL, icon_name="qubes-ask")
 
 def show_dialog(parent: Gtk.Widget, title: str, text: Union[str, Gtk.Widget],
-                buttons: Dict[str, Gtk.ResponseType],
+                buttons: Mapping[str, Gtk.ResponseType],
                 icon_name: str) -> Gtk.ResponseType:
     """
     Show a dialog.
@@ -93,7 +132,7 @@ def show_dialog(parent: Gtk.Widget, title: str, text: Union[str, Gtk.Widget],
     :param title: title of the prompt
     :param text: prompt text (can use pango markup)
     :param
-    :param buttons: dict of button-text: response type to use
+    :param buttons: mapping of button-text: response type to use
     :param icon_name: name of the icon to be show on the right side of
     the question
     :return: which button was pressed
@@ -106,11 +145,10 @@ def show_dialog(parent: Gtk.Widget, title: str, text: Union[str, Gtk.Widget],
     for key, value in buttons.items():
         button: Gtk.Button = dialog.add_button(key, value)
         button.set_use_underline(True)
-        button.get_style_context().add_class('flat_button')
-        if value in [Gtk.ResponseType.YES, Gtk.ResponseType.OK]:
-            button.get_style_context().add_class('button_save')
-        else:
-            button.get_style_context().add_class('button_cancel')
+        style_context = button.get_style_context()
+        style_context.add_class('flat_button')
+        style_context.add_class('button_save' if value in _ACCEPT_RESPONSES
+                                else 'button_cancel')
 
     dialog.set_title(title)
 
@@ -141,41 +179,54 @@ def show_dialog(parent: Gtk.Widget, title: str, text: Union[str, Gtk.Widget],
     dialog.destroy()
 
     if response == Gtk.ResponseType.DELETE_EVENT:
-        if Gtk.ResponseType.CANCEL in buttons.values():
+        available_responses = frozenset(buttons.values())
+        if Gtk.ResponseType.CANCEL in available_responses:
         # treat exiting from the window as cancel if it's one of the
         # available responses, then no if it's one of the available responses
             return Gtk.ResponseType.CANCEL
-        if Gtk.ResponseType.NO in buttons.values():
+        if Gtk.ResponseType.NO in available_responses:
             return Gtk.ResponseType.NO
     return response
 
 
+# css providers by theme file path, so that each file is parsed only once
+_CSS_PROVIDERS: Dict[str, Gtk.CssProvider] = {}
+# provider currently added to the default screen by load_theme
+_applied_provider: Optional[Gtk.CssProvider] = None
+
+
 def load_theme(widget: Gtk.Widget, light_theme_path: str, dark_theme_path: str):
     """
     Load a dark or light theme to current screen, based on widget's
-    current (system) defaults.
+    current (system) defaults. Previously loaded theme is replaced.
     :param widget: Gtk.Widget, preferably main window
     :param light_theme_path: path to file with light theme css
     :param dark_theme_path: path to file with dark theme css
     """
+    global _applied_provider  # pylint: disable=global-statement
     path = light_theme_path if is_theme_light(widget) else dark_theme_path
 
+    provider = _CSS_PROVIDERS.get(path)
+    if provider is None:
+        provider = Gtk.CssProvider()
+        provider.load_from_path(path)
+        _CSS_PROVIDERS[path] = provider
+
+    if provider is _applied_provider:
+        return
+
     screen = Gdk.Screen.get_default()
-    provider = Gtk.CssProvider()
-    provider.load_from_path(path)
+    if _applied_provider is not None:
+        Gtk.StyleContext.remove_provider_for_screen(screen, _applied_provider)
     Gtk.StyleContext.add_provider_for_screen(
         screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+    _applied_provider = provider
 
 
 def is_theme_light(widget):
     """Check if current theme is light or dark"""
     style_context: Gtk.StyleContext = widget.get_style_context()
-    background_color: Gdk.RGBA = style_context.get_background_color(
-        Gtk.StateType.NORMAL)
-    text_color: Gdk.RGBA = style_context.get_color(
-        Gtk.StateType.NORMAL)
-    background_intensity = background_color.red + \
-                           background_color.blue + background_color.green
-    text_intensity = text_color.red + text_color.blue + text_color.green
-
-    return text_intensity < background_intensity
+    bg: Gdk.RGBA = style_context.get_background_color(Gtk.StateType.NORMAL)
+    text: Gdk.RGBA = style_context.get_color(Gtk.StateType.NORMAL)
+
+    return text.red + text.green + text.blue < bg.red + bg.green + bg.blue
@@ -24,12 +24,13 @@ import gi
 
 import abc
 import qubesadmin.vm
-import itertools
+from functools import lru_cache
 
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GdkPixbuf, GLib
 
-from typing import Optional, Callable, Dict, Any, Union, List
+from typing import Optional, Callable, Dict, Any, Union, List, NamedTuple, \
+    Set, Tuple
 
 from .gtk_utils import load_icon, is_theme_light
 
@@ -57,7 +58,10 @@ class TokenName(Gtk.Box):
         self.set_token(token_name)
 
     def set_token(self, token_name):
-        """Set appropriate token/style for a given string."""
+        """Set appropriate token/style for a given string. Setting the token
+        that is already shown does not rebuild the widget."""
+        if token_name == self.token_name and self.get_children():
+            return
         self.token_name = token_name
         for child in self.get_children():
             self.remove(child)
@@ -165,11 +169,16 @@ class TextModeler(TraitSelector):
             elif selected_value is None and value is None:
                 self._initial_text = text
 
+        if not self._initial_text:
+            # first option, as displayed
+            self._initial_text = next(iter(self._values), None)
         if self._initial_text:
             self._combo.set_active_id(self._initial_text)
-        else:
-            self._combo.set_active(0)
-            self._initial_text = self._combo.get_active_text()
+
+        # value: displayed text, for select_value; if more texts share a value,
+        # the last one is used
+        self._texts_by_value: Dict[Any, str] = {
+            value: text for text, value in self._values.items()}
 
         if style_changes:
             self._combo.connect('changed', self._on_changed)
@@ -184,9 +193,9 @@ class TextModeler(TraitSelector):
 
     def select_value(self, selected_value):
         """Select provided value."""
-        for key, value in self._values.items():
-            if value == selected_value:
-                self._combo.set_active_id(key)
+        text = self._texts_by_value.get(selected_value)
+        if text is not None:
+            self._combo.set_active_id(text)
 
     def reset(self):
         """Select initial value."""
@@ -201,6 +210,20 @@ class TextModeler(TraitSelector):
         self._initial_text = self._combo.get_active_text()
 
 
+class _VMEntry(NamedTuple):
+    """Single VMListModeler entry."""
+    api_name: str
+    icon: Optional[GdkPixbuf.Pixbuf]
+    vm: Optional[qubesadmin.vm.QubesVM]
+    # row background and foreground color, if different from default
+    background: Optional[str] = None
+    foreground: Optional[str] = None
+
+
+# background and foreground of entries that are not vms
+_NON_VM_COLORS = ('#f2f2f2', '#000000')
+
+
 class VMListModeler(TraitSelector):
     """
     Modeler for Gtk.ComboBox contain a list of qubes VMs.
@@ -242,11 +265,19 @@ class VMListModeler(TraitSelector):
         self.change_function = event_callback
         self.style_changes = style_changes
 
-        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._entries: Dict[str, _VMEntry] = {}
+        # display names of entries in the order they are shown in the combo
+        self._sorted_display_names: List[str] = []
+        # indexes for select_value and is_vm_available
+        self._display_names_by_api_name: Dict[str, str] = {}
+        self._available_vms: Set[Optional[qubesadmin.vm.QubesVM]] = set()
 
-        self._icons: Dict[str, Gtk.Image] = {}
         self._icon_size = 20
 
+        # last result of _get_valid_qube_name, valid until the next change
+        self._valid_name: Optional[str] = None
+        self._valid_name_stale = True
+
         self._create_entries(filter_function, default_value, additional_options,
                              current_value)
 
@@ -254,6 +285,11 @@ class VMListModeler(TraitSelector):
 
         self._initial_id = None
 
+        # selecting the initial value changes both the combo and its entry;
+        # handle that once, instead of once per emitted signal
+        self.combo.handler_block(self._combo_handler)
+        self.entry_box.handler_block(self._entry_handler)
+
         if current_value:
             self.select_value(current_value)
         elif default_value:
@@ -261,8 +297,14 @@ class VMListModeler(TraitSelector):
         else:
             self.combo.set_active(0)
 
+        self.combo.handler_unblock(self._combo_handler)
+        self.entry_box.handler_unblock(self._entry_handler)
+
         self._initial_id = self.combo.get_active_id()
 
+        if self.combo.get_active() != -1:
+            self._combo_change(self.combo)
+
     def connect_change_callback(self, event_callback):
         """Add a function to be run after combobox value is changed."""
         self.change_function = event_callback
@@ -286,12 +328,6 @@ class VMListModeler(TraitSelector):
         """Reset changes."""
         self.combo.set_active_id(self._initial_id)
 
-    def _get_icon(self, name):
-        if name not in self._icons:
-            icon = load_icon(name, self._icon_size,  self._icon_size)
-            self._icons[name] = icon
-        return self._icons[name]
-
     def _create_entries(
             self,
             filter_function: Optional[Callable[[qubesadmin.vm.QubesVM], bool]],
@@ -303,42 +339,50 @@ class VMListModeler(TraitSelector):
             for api_name, display_name in additional_options.items():
                 if api_name == default_value:
                     display_name = display_name + ' (default)'
-                self._entries[display_name] = {
-                    "api_name": api_name,
-                    "icon": None,
-                    "vm": None
-                }
+                self._entries[display_name] = _VMEntry(
+                    api_name, None, None, *_NON_VM_COLORS)
+
+        # vms compare equal to their names, so compare names only once
+        default_name = str(default_value) if default_value else None
 
         for domain in self.qapp.domains:
             if filter_function and not filter_function(domain):
                 continue
+            # every property read is a qrexec call, so each is read only once
             vm_name = domain.name
-            icon = self._get_icon(domain.icon)
+            # load_icon caches icons, so they are shared between modelers
+            icon = load_icon(domain.icon, self._icon_size, self._icon_size)
             display_name = vm_name
 
-            if domain == default_value:
+            if vm_name == default_name:
                 display_name = display_name + ' (default)'
 
-            self._entries[display_name] = {
-                "api_name": vm_name,
-                "icon": icon,
-                "vm": domain,
-            }
+            self._entries[display_name] = _VMEntry(vm_name, icon, domain)
 
-        if current_value:
-            found_current = False
-            for _, value in self._entries.items():
-                if value["api_name"] == current_value:
-                    found_current = True
-                    break
-            if not found_current:
-                self._entries[str(current_value)] = {
-                    "api_name": str(current_value),
-                    "icon": None,
-                    "vm": None
-                }
+        # if more entries share an api name, the last one is selected
+        self._display_names_by_api_name = {
+            entry.api_name: display_name
+            for display_name, entry in self._entries.items()}
+
+        if current_value and \
+                str(current_value) not in self._display_names_by_api_name:
+            self._entries[str(current_value)] = _VMEntry(
+                str(current_value), None, None, *_NON_VM_COLORS)
+            self._display_names_by_api_name[str(current_value)] = \
+                str(current_value)
+
+        self._sorted_display_names = sorted(self._entries)
+        self._available_vms = {entry.vm for entry in self._entries.values()}
 
     def _get_valid_qube_name(self):
+        # every change of the combo or the entry emits a changed signal,
+        # and both handlers mark the cached name as stale
+        if self._valid_name_stale:
+            self._valid_name = self._find_valid_qube_name()
+            self._valid_name_stale = False
+        return self._valid_name
+
+    def _find_valid_qube_name(self) -> Optional[str]:
         selected = self.combo.get_active_id()
         if selected in self._entries:
             return selected
@@ -350,12 +394,13 @@ class VMListModeler(TraitSelector):
         return None
 
     def _combo_change(self, _widget):
+        self._valid_name_stale = True
         name = self._get_valid_qube_name()
 
         if name:
             entry = self._entries[name]
             self.entry_box.set_icon_from_pixbuf(
-                Gtk.EntryIconPosition.PRIMARY, entry["icon"]
+                Gtk.EntryIconPosition.PRIMARY, entry.icon
             )
         else:
             self.entry_box.set_icon_from_pixbuf(
@@ -372,58 +417,71 @@ class VMListModeler(TraitSelector):
 
     def _apply_model(self):
         assert isinstance(self.combo, Gtk.ComboBox)
-        list_store = Gtk.ListStore(int, str, GdkPixbuf.Pixbuf, str, str, str)
+        # columns: display name, icon, api name, background, foreground
+        list_store = Gtk.ListStore(str, GdkPixbuf.Pixbuf, str, str, str)
 
-        for entry_no, display_name in zip(itertools.count(),
-                                          sorted(self._entries)):
+        # the store is filled before being attached to the combo and its
+        # completion, so no views are updated row by row
+        for display_name in self._sorted_display_names:
             entry = self._entries[display_name]
             list_store.append(
                 [
-                    entry_no,
                     display_name,
-                    entry["icon"],
-                    entry["api_name"],
-                    '#f2f2f2' if entry['vm'] is None else None,  # background
-                    '#000000' if entry['vm'] is None else None,  # foreground
+                    entry.icon,
+                    entry.api_name,
+                    entry.background,
+                    entry.foreground,
                 ])
 
         self.combo.set_model(list_store)
-        self.combo.set_id_column(1)
+        self.combo.set_id_column(0)
 
         icon_column = Gtk.CellRendererPixbuf()
         self.combo.pack_start(icon_column, False)
-        self.combo.add_attribute(icon_column, "pixbuf", 2)
-        self.combo.set_entry_text_column(1)
+        self.combo.add_attribute(icon_column, "pixbuf", 1)
+        self.combo.set_entry_text_column(0)
+
+        # completion is only needed once the user starts typing, so it is
+        # created when the entry is first focused
+        self._completion_handler = self.entry_box.connect(
+            "focus-in-event", self._create_completion)
+
+        # A Combo with an entry has a text column already
+        text_column: Gtk.CellRenderer = self.combo.get_cells()[0]
+        self.combo.reorder(text_column, 1)
+
+        # use list_store's 4th and 5th columns as source for background and
+        # foreground color
+        self.combo.add_attribute(text_column, 'background', 3)
+        self.combo.add_attribute(text_column, 'foreground', 4)
+
+        self._combo_handler = self.combo.connect("changed", self._combo_change)
+        self._entry_handler = self.entry_box.connect("changed",
+                                                     self._event_callback)
 
-        entry_box = self.combo.get_child()
+    def _create_completion(self, *_args):
+        self.entry_box.disconnect(self._completion_handler)
 
+        icon_column = Gtk.CellRendererPixbuf()
         area = Gtk.CellAreaBox()
         area.pack_start(icon_column, False, False, False)
-        area.add_attribute(icon_column, "pixbuf", 2)
+        area.add_attribute(icon_column, "pixbuf", 1)
 
         completion = Gtk.EntryCompletion.new_with_area(area)
         completion.set_inline_selection(True)
         completion.set_inline_completion(True)
         completion.set_popup_completion(True)
         completion.set_popup_single_match(False)
-        completion.set_model(list_store)
-        completion.set_text_column(1)
-
-        entry_box.set_completion(completion)
-
-        # A Combo with an entry has a text column already
-        text_column: Gtk.CellRenderer = self.combo.get_cells()[0]
-        self.combo.reorder(text_column, 1)
+        completion.set_model(self.combo.get_model())
+        # Gtk's default match function is already a case-insensitive prefix
+        # match done in C; a Python match function would only be slower
+        completion.set_text_column(0)
 
-        # use list_store's 4th and 5th columns as source for background and
-        # foreground color
-        self.combo.add_attribute(text_column, 'background', 4)
-        self.combo.add_attribute(text_column, 'foreground', 5)
-
-        self.combo.connect("changed", self._combo_change)
-        self.entry_box.connect("changed", self._event_callback)
+        self.entry_box.set_completion(completion)
+        return False
 
     def _event_callback(self, *_args):
+        self._valid_name_stale = True
         if self.change_function:
             self.change_function()
 
@@ -438,11 +496,11 @@ class VMListModeler(TraitSelector):
         selected = self._get_valid_qube_name()
 
         if selected in self._entries:
+            entry = self._entries[selected]
             # special treatment for None:
-            if self._entries[selected]['api_name'] == "None":
+            if entry.api_name == "None":
                 return None
-            return self._entries[selected]["vm"] or \
-                   self._entries[selected]["api_name"]
+            return entry.vm or entry.api_name
         return None
 
     def select_value(self, vm_name):
@@ -451,16 +509,15 @@ class VMListModeler(TraitSelector):
         :param vm_name: str
         :return: None
         """
-        for display_name, entry in self._entries.items():
-            if entry["api_name"] == vm_name:
-                self.combo.set_active_id(display_name)
+        if vm_name is None:
+            return
+        display_name = self._display_names_by_api_name.get(str(vm_name))
+        if display_name is not None:
+            self.combo.set_active_id(display_name)
 
     def is_vm_available(self, vm: qubesadmin.vm.QubesVM) -> bool:
         """Check if given VM is available in the list."""
-        for entry in self._entries.values():
-            if entry['vm'] == vm:
-                return True
-        return False
+        return vm in self._available_vms
 
 
 class ImageListModeler(TraitSelector):
@@ -544,6 +601,7 @@ class ImageListModeler(TraitSelector):
         assert isinstance(self.combo, Gtk.ComboBox)
         list_store = Gtk.ListStore(str, GdkPixbuf.Pixbuf)
 
+        # filled before being attached to the combo, as in VMListModeler
         for entry_name, entry in self._entries.items():
             list_store.append(
                 [
@@ -625,6 +683,9 @@ class ImageTextButton(Gtk.Button):
 
 class ProgressBarDialog(Gtk.Window):
     """Simple window showing a progress bar."""
+    # minimum time between processing pending events, in microseconds
+    MIN_REDRAW_INTERVAL = 1000000 // 30
+
     def __init__(self, parent_application: Gtk.Application, loading_text: str):
         super().__init__()
         self.parent_application = parent_application
@@ -641,6 +702,7 @@ class ProgressBarDialog(Gtk.Window):
         self.progress_bar.get_style_context().add_class('loading')
         self.progress_bar.set_fraction(0)
         self.current_progress = 0
+        self._last_redraw: Optional[int] = None
 
         self.box.pack_start(self.progress_bar, False, False, 10)
 
@@ -656,6 +718,15 @@ class ProgressBarDialog(Gtk.Window):
 
         self.progress_bar.set_fraction(self.current_progress)
 
+        # progress is reported from the main thread while loading, so
+        # idle callbacks would not run until loading is done; instead,
+        # process pending events directly, but not more often than needed
+        now = GLib.get_monotonic_time()
+        if self._last_redraw is not None and self.current_progress < 1 and \
+                now - self._last_redraw < self.MIN_REDRAW_INTERVAL:
+            return
+        self._last_redraw = now
+
         while Gtk.events_pending():
             Gtk.main_iteration_do(True)
 
@@ -663,6 +734,16 @@ class ProgressBarDialog(Gtk.Window):
         self.parent_application.quit()
 
 
+@lru_cache(maxsize=1)
+def _expander_icons() -> Tuple[GdkPixbuf.Pixbuf, GdkPixbuf.Pixbuf]:
+    """Icons for hidden and shown state of expanders, in the variant matching
+    current theme. The theme is loaded once on startup, so they are computed
+    only once."""
+    suffix = 'black' if is_theme_light(Gtk.Window()) else 'white'
+    return (load_icon(f'qubes-expander-hidden-{suffix}', 18, 18),
+            load_icon(f'qubes-expander-shown-{suffix}', 20, 20))
+
+
 class ExpanderHandler:
     """A class to handle showing/hiding something on click."""
     def __init__(self,
@@ -699,11 +780,10 @@ class ExpanderHandler:
         self.text_shown = text_shown
         self.text_hidden = text_hidden
 
-        # get variant
-        suffix = 'black' if is_theme_light(Gtk.Window()) else 'white'
-        self.icon_hidden = load_icon(f'qubes-expander-hidden-{suffix}', 18, 18)
-        self.icon_shown = load_icon(f'qubes-expander-shown-{suffix}', 20, 20)
+        self.icon_hidden, self.icon_shown = _expander_icons()
 
+        # last state set with set_state, None if it was never set
+        self._state: Optional[bool] = None
         self.set_state(False)
 
     def _show_hide(self, *_args):
@@ -711,15 +791,20 @@ class ExpanderHandler:
 
     def set_state(self, state: bool):
         """Show data if state is true, hide it otherwise"""
+        if state == self._state and \
+                state == self.data_container.get_visible():
+            return
+        self._state = state
         self.data_container.set_visible(state)
 
         if state:
             self.icon.set_from_pixbuf(self.icon_shown)
             if self.label:
                 self.label.set_text(self.text_shown)
-            for child in reversed(self.data_container.get_children()):
-                if child.get_can_focus():
-                    child.grab_focus()
+            if not self.data_container.get_focus_child():
+                for child in reversed(self.data_container.get_children()):
+                    if child.get_can_focus():
+                        child.grab_focus()
 
         else:
             self.icon.set_from_pixbuf(self.icon_hidden)
@@ -730,6 +815,12 @@ class ExpanderHandler:
             self.event_callback(state)
 
 
+# Gtk resizes at PRIORITY_HIGH_IDLE + 10 and redraws at PRIORITY_HIGH_IDLE + 20;
+# scroll after widgets are allocated, but before they are drawn, so that
+# scrolling does not cause a second redraw
+SCROLL_PRIORITY = GLib.PRIORITY_HIGH_IDLE + 15
+
+
 class ViewportHandler:
     """A class that enables auto-scrolling to the focused widget."""
     def __init__(self, main_window: Gtk.Window,
@@ -737,26 +828,35 @@ class ViewportHandler:
         self.scrolled_windows = scrolled_windows
         self.main_window = main_window
 
+        # only one scroll is pending at a time; it uses the latest focus change
+        self._pending_scroll_id: Optional[int] = None
+        self._pending_viewport: Optional[Gtk.Viewport] = None
+        self._pending_child: Optional[Gtk.Widget] = None
+
         for viewport in [scrolled_window.get_child()
                          for scrolled_window in self.scrolled_windows]:
             viewport.connect('set-focus-child',
                               self._viewport_set_focus_child)
 
-    def is_child(self, widget, container):
+    @staticmethod
+    def is_child(widget, container):
         """
-        Go recursively over all children of container, to check if widget is
-        a child of it.
+        Check if widget is a (possibly indirect) child of container, by
+        walking up the widget's parents.
         """
-        for child in container.get_children():
-            if child is widget:
-                return True
-            if isinstance(child, Gtk.Container):
-                if self.is_child(widget, child):
-                    return True
-        return False
+        return widget is not None and widget.is_ancestor(container)
 
     def _viewport_set_focus_child(self, viewport, child):
-        GLib.idle_add(self.scroll_slide_viewport, viewport, child)
+        self._pending_viewport = viewport
+        self._pending_child = child
+        if self._pending_scroll_id is None:
+            self._pending_scroll_id = GLib.idle_add(
+                self._do_pending_scroll, priority=SCROLL_PRIORITY)
+
+    def _do_pending_scroll(self):
+        self._pending_scroll_id = None
+        self.scroll_slide_viewport(self._pending_viewport, self._pending_child)
+        return False
 
     def scroll_slide_viewport(self, viewport, widget):
         """Scroll the viewport if needed to see the current focused widget"""
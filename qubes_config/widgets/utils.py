@@ -72,11 +72,11 @@ class BiDictionary(dict):
     cause errors."""
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.inverted: Dict[Any, Any] = {}
-        for key, value in self.items():
-            if value in self.inverted:
-                raise ValueError
-            self.inverted[value] = key
+        self.inverted: Dict[Any, Any] = {
+            value: key for key, value in self.items()}
+        # duplicate values collapse into a single inverted key
+        if len(self.inverted) != len(self):
+            raise ValueError
 
     def __setitem__(self, key, value):
         if key in self: